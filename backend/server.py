@@ -1,42 +1,204 @@
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any, List
+from typing import Annotated, Any, Callable, Iterator, List, Literal
 import os
 import logging
+import functools
+import hashlib
+import inspect
+import io
+import itertools
+import struct
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from dotenv import load_dotenv
 import base64
 import pickle
 import json
-import requests
-import urllib3
 import uuid
 
 import math
 import numpy as np
-import pandas as pd
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Body,
+    Depends,
+    Header,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-import psycopg2
-from psycopg2.extras import Json
+from fastapi.routing import APIRoute
+from starlette.convertors import Convertor, register_url_convertor
+from pydantic import BaseModel, Field, WrapValidator, model_validator
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Suppress warnings for disabled SSL certificate verification
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+def _lazy(factory: Callable[[], Any]) -> Callable[[], Any]:
+    """Memoize a zero-argument factory on first call.
 
-def getAccessToken(client_id: str | None = None, client_secret: str | None = None) -> str:
-    """Retrieve OAuth access token for GigaChat API.
+    Concurrent first calls build the value once. Failures are not cached, so
+    the next call retries. ``loaded()`` reports whether the value exists
+    without building it, and ``discard(stale)`` forgets the value if it is
+    still ``stale`` so the next call builds a new one.
+    """
+    lock = threading.Lock()
+    missing = object()
+    value: Any = missing
 
-    Args:
-        client_id: Optional client identifier overriding env var.
-        client_secret: Optional client secret overriding env var.
+    @functools.wraps(factory)
+    def get() -> Any:
+        nonlocal value
+        if value is missing:
+            with lock:
+                if value is missing:
+                    value = factory()
+        return value
+
+    def discard(stale: Any) -> None:
+        nonlocal value
+        with lock:
+            if value is stale:
+                value = missing
+
+    get.loaded = lambda: value is not missing  # type: ignore[attr-defined]
+    get.discard = discard  # type: ignore[attr-defined]
+    return get
+
+
+@_lazy
+def _pandas() -> Any:
+    """Return the ``pandas`` module, imported on first use."""
+    import pandas
+
+    return pandas
+
+
+@_lazy
+def _psycopg2() -> Any:
+    """Return ``psycopg2`` with its ``pool`` and ``extras`` modules loaded."""
+    import psycopg2
+    import psycopg2.extras  # noqa: F401
+    import psycopg2.pool  # noqa: F401
+
+    return psycopg2
+
+
+@_lazy
+def _process_context() -> Any:
+    """Return the multiprocessing context used for worker processes.
+
+    Forking copies held locks, so a child forked while the warmup thread
+    imports a model can deadlock. Workers come from a forkserver that has
+    already imported numpy, pandas and this module instead, or are spawned
+    where forkserver is unavailable.
+    """
+    import multiprocessing
+
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")  # pragma: no cover - Windows
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["numpy", "pandas", __name__])
+    return context
+
+
+def is_opaque_id(ref: str) -> bool:
+    """Whether ``ref`` looks like an id issued by a server-side store."""
+    return len(ref) == 32 and all(c in "0123456789abcdef" for c in ref)
+
+
+GIGACHAT_MAX_CONNECTIONS = int(os.environ.get("GIGACHAT_MAX_CONNECTIONS", 20))
+# seconds before the reported expiry at which a cached token is refreshed
+GIGACHAT_TOKEN_MARGIN = float(os.environ.get("GIGACHAT_TOKEN_MARGIN", 60))
+# GigaChat tokens live 30 minutes; used when the response has no expires_at
+_GIGACHAT_TOKEN_TTL = 1800.0
+
+_gigachat_client: tuple[Any, Any] | None = None
+
+
+def gigachat_client() -> Any:
+    """Return the shared keep-alive ``httpx.AsyncClient`` for GigaChat calls.
+
+    One client (and connection pool) is kept per event loop; the server runs a
+    single loop, so in practice every request reuses the same connections.
+    """
+    global _gigachat_client
+    import asyncio
+
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    if _gigachat_client is None or _gigachat_client[0] is not loop:
+        client = httpx.AsyncClient(
+            # self-signed certificates are common for GigaChat endpoints
+            verify=False,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=GIGACHAT_MAX_CONNECTIONS,
+                max_keepalive_connections=GIGACHAT_MAX_CONNECTIONS,
+            ),
+        )
+        _gigachat_client = (loop, client)
+    return _gigachat_client[1]
+
+
+class TokenCache:
+    """OAuth access tokens shared across requests until shortly before expiry.
+
+    Tokens are keyed by credentials and scope. Concurrent requests for a
+    missing token wait for a single OAuth round-trip.
     """
 
+    def __init__(self, margin: float):
+        self.margin = margin
+        self._tokens: dict[tuple, tuple[str, float]] = {}
+        self._pending: dict[tuple, Any] = {}
+
+    async def get(self, key: tuple, fetch: Callable[[], Any]) -> str:
+        import asyncio
+
+        entry = self._tokens.get(key)
+        if entry is not None and time.time() < entry[1] - self.margin:
+            return entry[0]
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(fetch())
+            pending.add_done_callback(functools.partial(self._store, key))
+        # a cancelled request must not cancel the fetch other requests await
+        token, _ = await asyncio.shield(pending)
+        return token
+
+    def _store(self, key: tuple, future: Any) -> None:
+        self._pending.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self._tokens[key] = future.result()
+
+    def invalidate(self, key: tuple) -> None:
+        self._tokens.pop(key, None)
+
+
+GIGACHAT_TOKENS = TokenCache(GIGACHAT_TOKEN_MARGIN)
+
+
+def _gigachat_credentials(
+    client_id: str | None, client_secret: str | None
+) -> tuple[str, str, str, str]:
     client_id = client_id or os.environ.get("GIGACHAT_CLIENT_ID")
     client_secret = client_secret or os.environ.get("GIGACHAT_CLIENT_SECRET")
     scope = os.environ.get("GIGACHAT_SCOPE", "GIGACHAT_API_PERS")
@@ -45,6 +207,14 @@ def getAccessToken(client_id: str | None = None, client_secret: str | None = Non
     )
     if not client_id or not client_secret:
         raise HTTPException(status_code=400, detail="GigaChat credentials not configured")
+    return client_id, client_secret, scope, oauth_url
+
+
+async def _fetch_access_token(
+    client_id: str, client_secret: str, scope: str, oauth_url: str
+) -> tuple[str, float]:
+    import httpx
+
     auth = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
     headers = {
         "Authorization": f"Basic {auth}",
@@ -52,33 +222,806 @@ def getAccessToken(client_id: str | None = None, client_secret: str | None = Non
         "Accept": "application/json",
         "RqUID": str(uuid.uuid4()),
     }
-    data = {"scope": scope}
-    # Disable SSL certificate verification to support self-signed certificates
     try:
-        response = requests.post(
-            oauth_url, headers=headers, data=data, timeout=30, verify=False
+        response = await gigachat_client().post(
+            oauth_url, headers=headers, data={"scope": scope}, timeout=30
         )
         response.raise_for_status()
-    except requests.exceptions.RequestException as exc:
+    except httpx.HTTPError as exc:
         raise HTTPException(
             status_code=502, detail=f"Failed to retrieve access token: {exc}"
         ) from exc
-    token = response.json().get("access_token")
+    body = response.json()
+    token = body.get("access_token")
     if not token:
         raise HTTPException(status_code=502, detail="No access token in response")
-    return token
+    expires_at = body.get("expires_at")
+    if expires_at is None:
+        expires_at = time.time() + _GIGACHAT_TOKEN_TTL
+    elif expires_at > 1e11:  # GigaChat reports milliseconds
+        expires_at /= 1000
+    return token, float(expires_at)
+
+
+async def get_access_token(
+    client_id: str | None = None, client_secret: str | None = None
+) -> str:
+    """Return a GigaChat OAuth token, reusing a cached one until it expires.
+
+    Args:
+        client_id: Optional client identifier overriding env var.
+        client_secret: Optional client secret overriding env var.
+    """
+    key = _gigachat_credentials(client_id, client_secret)
+    return await GIGACHAT_TOKENS.get(key, lambda: _fetch_access_token(*key))
+
+ARRAY_MEDIA_TYPES: dict[str, str] = {
+    "npy": "application/x-npy",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+_ARROW_FILE_MEDIA_TYPE = "application/vnd.apache.arrow.file"
+
+# Binary format requested through the Accept header of the current request.
+_RESPONSE_FORMAT: ContextVar[str | None] = ContextVar("_RESPONSE_FORMAT", default=None)
+
+
+def array_format(media_type: str | None) -> str | None:
+    """Map a Content-Type/Accept header value to a binary array format."""
+    if not media_type:
+        return None
+    for part in media_type.split(","):
+        value = part.split(";")[0].strip().lower()
+        if value == ARRAY_MEDIA_TYPES["npy"]:
+            return "npy"
+        if value in (ARRAY_MEDIA_TYPES["arrow"], _ARROW_FILE_MEDIA_TYPE):
+            return "arrow"
+    return None
+
+
+def _import_pyarrow() -> Any:
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except Exception as exc:  # pragma: no cover - pyarrow missing
+        raise HTTPException(status_code=415, detail=f"Arrow support unavailable: {exc}")
+    return pa
+
+
+def decode_array(body: bytes, fmt: str) -> np.ndarray:
+    """Decode an NPY or Arrow IPC payload into an ndarray without copying.
+
+    NPY arrays are viewed directly on the request bytes. Arrow tables holding a
+    single fixed-size-list or primitive column are viewed zero-copy; tables with
+    several numeric columns are stacked into a 2D array.
+    """
+    if fmt == "npy":
+        stream = io.BytesIO(body)
+        try:
+            version = np.lib.format.read_magic(stream)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(stream)
+            else:
+                header = np.lib.format.read_array_header_2_0(stream)
+            shape, fortran_order, dtype = header
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid NPY payload: {exc}")
+        if dtype.hasobject:
+            raise HTTPException(status_code=400, detail="Object arrays are not supported")
+        count = math.prod(shape)
+        try:
+            arr = np.frombuffer(body, dtype=dtype, count=count, offset=stream.tell())
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid NPY payload: {exc}")
+        return arr.reshape(shape, order="F" if fortran_order else "C")
+
+    pa = _import_pyarrow()
+    try:
+        buf = pa.py_buffer(body)
+        try:
+            table = pa.ipc.open_stream(buf).read_all()
+        except pa.ArrowInvalid:
+            table = pa.ipc.open_file(buf).read_all()
+    except pa.ArrowException as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid Arrow payload: {exc}")
+    if table.num_columns == 1:
+        column = table.column(0).combine_chunks()
+        if pa.types.is_fixed_size_list(column.type):
+            values = column.flatten().to_numpy(zero_copy_only=False)
+            return values.reshape(-1, column.type.list_size)
+        return column.to_numpy(zero_copy_only=False)
+    return np.column_stack([c.to_numpy() for c in table.columns])
+
+
+def encode_array(arr: np.ndarray, fmt: str) -> bytes:
+    """Serialize ``arr`` as NPY or as an Arrow IPC stream."""
+    if fmt == "npy":
+        buf = io.BytesIO()
+        np.lib.format.write_array(buf, np.asarray(arr), allow_pickle=False)
+        return buf.getvalue()
+
+    pa = _import_pyarrow()
+    arr = np.ascontiguousarray(arr)
+    if arr.ndim == 2:
+        column = pa.FixedSizeListArray.from_arrays(pa.array(arr.ravel()), arr.shape[1])
+    else:
+        column = pa.array(arr.ravel())
+    table = pa.table({"data": column})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Convert ndarrays (possibly nested in dicts) into plain lists."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {k: _to_jsonable(v) for k, v in value.items()}
+    return value
+
+
+def _contains_array(value: Any) -> bool:
+    if isinstance(value, np.ndarray):
+        return True
+    if isinstance(value, dict):
+        return any(_contains_array(v) for v in value.values())
+    return False
+
+
+def _round_floats(value: Any, precision: int | None, float32: bool) -> Any:
+    """Round and/or downcast the float arrays inside ``value`` for JSON output."""
+    if isinstance(value, np.ndarray) and value.dtype.kind == "f":
+        if precision is not None:
+            value = np.round(value, precision)
+        return value.astype(np.float32) if float32 else value
+    if isinstance(value, dict):
+        return {k: _round_floats(v, precision, float32) for k, v in value.items()}
+    return value
+
+
+@_lazy
+def _orjson() -> Any:
+    """Return the ``orjson`` module, or None when it is not installed."""
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+def _orjson_default(value: Any) -> Any:
+    # arrays orjson cannot write natively (non-contiguous, object dtype ...)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class NumpyJSONResponse(JSONResponse):
+    """JSON response that writes ndarrays without converting them to lists.
+
+    With orjson installed arrays are serialized straight from their buffers
+    (NaN and infinity become ``null``); otherwise they go through
+    ``tolist()`` and the standard JSON encoder. ``precision`` rounds float
+    arrays to that many decimals and ``float32`` writes them with float32
+    round-trip precision (about 7 significant digits).
+    """
+
+    def __init__(
+        self,
+        content: Any,
+        precision: int | None = None,
+        float32: bool = False,
+        **kwargs: Any,
+    ):
+        self.precision = precision
+        self.float32 = float32
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        content = _round_floats(content, self.precision, self.float32)
+        orjson = _orjson()
+        if orjson is None:
+            return super().render(_to_jsonable(content))
+        return orjson.dumps(
+            content, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
+# JSON float options (precision, float32) requested by the current request.
+_JSON_FLOATS: ContextVar[tuple[int | None, bool]] = ContextVar(
+    "_JSON_FLOATS", default=(None, False)
+)
+
+
+def json_float_options(query: Any) -> tuple[int | None, bool]:
+    """Read the ``precision`` and ``float32`` query parameters."""
+    precision = query.get("precision")
+    if precision is not None:
+        try:
+            precision = int(precision)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="precision must be an integer")
+        if not 0 <= precision <= 17:
+            raise HTTPException(status_code=400, detail="precision must be within 0-17")
+    float32 = (query.get("float32") or "").lower() in ("1", "true", "yes")
+    return precision, float32
+
+
+def _encode_result(value: Any, response: Response | None = None) -> Any:
+    fmt = _RESPONSE_FORMAT.get()
+    if fmt and isinstance(value, np.ndarray):
+        encoded = Response(encode_array(value, fmt), media_type=ARRAY_MEDIA_TYPES[fmt])
+    elif _contains_array(value):
+        encoded = NumpyJSONResponse(value, *_JSON_FLOATS.get())
+    else:
+        return value
+    if isinstance(response, Response):
+        # FastAPI only applies headers set on the injected response when it
+        # builds the response itself
+        encoded.raw_headers.extend(
+            (key, val)
+            for key, val in response.raw_headers
+            if key not in (b"content-length", b"content-type")
+        )
+    return encoded
+
+
+def _with_array_encoding(endpoint: Callable) -> Callable:
+    """Wrap an endpoint so ndarray results honour the negotiated format.
+
+    The wrapper also marks when the endpoint body starts and returns, which
+    separates the compute phase from parsing and serialization, and samples
+    the thread running the endpoint when the request is being profiled.
+    """
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            with _profiling():
+                _mark("called")
+                result = await endpoint(*args, **kwargs)
+                _mark("returned")
+                return _encode_result(result, kwargs.get("response"))
+
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with _profiling():
+            _mark("called")
+            result = endpoint(*args, **kwargs)
+            _mark("returned")
+            return _encode_result(result, kwargs.get("response"))
+
+    return wrapper
+
+
+class _DecodedArrayRequest(Request):
+    """Request whose JSON body has been replaced by a decoded array payload."""
+
+    def __init__(self, request: Request, raw: bytes, payload: dict):
+        scope = dict(request.scope)
+        scope["headers"] = [
+            (k, v) for k, v in request.scope["headers"] if k != b"content-type"
+        ] + [(b"content-type", b"application/json")]
+        super().__init__(scope, request.receive)
+        self._raw = raw
+        self._payload = payload
+
+    async def body(self) -> bytes:
+        return self._raw
+
+    async def json(self) -> Any:
+        return self._payload
+
+
+def _query_value(value: str) -> Any:
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+_DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+_SIZE_BUCKETS = tuple(256 * 4**i for i in range(11))
+
+
+def _label_str(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter per label combination, rendered in Prometheus format."""
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: Any, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram per label combination, rendered in Prometheus format."""
+
+    def __init__(
+        self, name: str, doc: str, labels: tuple[str, ...], buckets: tuple[float, ...]
+    ):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: Any) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # bucket counts, then sum and count
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _label_str(self.labels, values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_str(self.labels, values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                labels = _label_str(self.labels, values)
+                lines.append(f"{self.name}_sum{labels} {series[-2]}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+REQUESTS_TOTAL = Counter(
+    "http_requests_total", "Requests handled.", ("method", "endpoint", "status")
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from routing to a finished response.",
+    ("method", "endpoint"),
+    _DURATION_BUCKETS,
+)
+REQUEST_PHASES = Histogram(
+    "http_request_phase_seconds",
+    "Time spent per request phase (parse, compute, fit, serialize).",
+    ("endpoint", "phase"),
+    _DURATION_BUCKETS,
+)
+REQUEST_BYTES = Histogram(
+    "http_request_size_bytes", "Request body size.", ("endpoint",), _SIZE_BUCKETS
+)
+RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "Response body size.", ("endpoint",), _SIZE_BUCKETS
+)
+_IN_FLIGHT = {"requests": 0}
+
+# Timestamps and phase totals of the request being handled. The dict is shared
+# with the threadpool worker running the endpoint, so marks set there are
+# visible to the route handler.
+_REQUEST_TIMINGS: ContextVar[dict | None] = ContextVar("_REQUEST_TIMINGS", default=None)
+
+
+@contextmanager
+def timed_phase(name: str) -> Iterator[None]:
+    """Add the duration of the block to phase ``name`` of the current request."""
+    timings = _REQUEST_TIMINGS.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            phases = timings.setdefault("phases", {})
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def _mark(name: str) -> None:
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings[name] = time.perf_counter()
+
+
+def request_phases(timings: dict, end: float) -> dict[str, float]:
+    """Split a request into parse, compute and serialize phases.
+
+    ``parse`` runs from routing to the endpoint call and includes reading the
+    body, validation and waiting for a threadpool worker; ``serialize`` covers
+    everything after the endpoint returns. Phases recorded with
+    :func:`timed_phase` (such as ``fit``) are nested inside ``compute``.
+    """
+    start = timings["start"]
+    called = timings.get("called", end)
+    returned = timings.get("returned", end)
+    phases = {
+        "parse": called - start,
+        "compute": returned - called,
+        "serialize": end - returned,
+    }
+    phases.update(timings.get("phases", {}))
+    return phases
+
+
+def server_timing(phases: dict[str, float], total: float) -> str:
+    """Format phase durations as a ``Server-Timing`` header value."""
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = int(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+PROFILE_DIR = Path(
+    os.environ.get(
+        "PROFILE_DIR", Path(__file__).resolve().parents[1] / "data" / "profiles"
+    )
+)
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 200))
+_PROFILE_COUNTER = itertools.count(1)
 
-app = FastAPI(title="Cognitive Pipelines API")
+# Profile being collected for the current request, if any.
+_PROFILE: ContextVar[dict | None] = ContextVar("_PROFILE", default=None)
+
+
+def _frame_label(code: Any) -> str:
+    path = Path(code.co_filename)
+    return f"{code.co_qualname} ({path.parent.name}/{path.name}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Sample the Python stack of one thread from a background thread.
+
+    Stacks are counted in collapsed form (``outer;inner;leaf``). Time spent
+    in native code is attributed to the Python frame that called it.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                stack = ";".join(reversed(labels))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict[str, int]:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+@contextmanager
+def _profiling() -> Iterator[None]:
+    """Sample the calling thread while the block runs if the request is profiled."""
+    profile = _PROFILE.get()
+    if profile is None:
+        yield
+        return
+    sampler = StackSampler(threading.get_ident(), profile["interval"]).start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile["stacks"] = sampler.stop()
+        profile["duration"] = time.perf_counter() - start
+
+
+def _profile_trigger(request: Request) -> str | None:
+    """Return why ``request`` should be profiled, or None."""
+    if PROFILING_ENABLED:
+        flag = request.headers.get("x-profile") or request.query_params.get("profile")
+        if flag and flag.lower() in ("1", "true", "yes"):
+            return "request"
+    if PROFILE_SAMPLE_RATE > 0 and next(_PROFILE_COUNTER) % PROFILE_SAMPLE_RATE == 0:
+        return "sampled"
+    return None
+
+
+def speedscope_profile(profile: dict) -> dict:
+    """Convert a stored profile into the speedscope file format.
+
+    Samples are weighted so that they add up to the measured duration; the
+    sampler falls behind its interval while the profiled thread holds the GIL.
+    """
+    frames: list[dict] = []
+    index: dict[str, int] = {}
+    samples, weights = [], []
+    total = sum(profile["stacks"].values())
+    weight = profile["duration"] / total if total else profile["interval"]
+    for stack, count in profile["stacks"].items():
+        ids = []
+        for label in stack.split(";"):
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            ids.append(index[label])
+        samples.append(ids)
+        weights.append(count * weight)
+    name = f"{profile['method']} {profile['url']}"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "cognitive-pipelines",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+class ProfileStore:
+    """Rotating on-disk store of request profiles.
+
+    Each profile is a JSON file named after its id; once more than
+    ``max_files`` are stored the oldest ones are deleted.
+    """
+
+    def __init__(self, directory: Path, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str) -> Path:
+        return self.directory / f"{profile_id}.json"
+
+    def save(self, profile: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path(profile["id"]).write_text(json.dumps(profile))
+        with self._lock:
+            paths = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+            for path in paths[: max(len(paths) - self.max_files, 0)]:
+                path.unlink(missing_ok=True)
+
+    def get(self, profile_id: str) -> dict:
+        if not is_opaque_id(profile_id):
+            raise HTTPException(status_code=404, detail="Profile not found")
+        try:
+            return json.loads(self._path(profile_id).read_text())
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Profile not found")
+
+    def list(self) -> list[dict]:
+        entries = []
+        for path in sorted(
+            self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True
+        ):
+            try:
+                profile = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            profile["samples"] = sum(profile.pop("stacks").values())
+            entries.append(profile)
+        return entries
+
+
+PROFILES = ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES)
+
+
+class ArrayRoute(APIRoute):
+    """Route that speaks NPY and Arrow IPC in addition to JSON.
+
+    A binary request body becomes the ``data`` field of the endpoint's model;
+    the remaining fields (``params``, ``cmap`` ...) are read from the query
+    string, JSON-decoded where possible. Endpoints returning an ndarray answer
+    in the binary format named by the Accept header, and in JSON otherwise
+    (written by :class:`NumpyJSONResponse`, trimmed by the ``precision`` and
+    ``float32`` query parameters). Unless ``METRICS_ENABLED=0`` every request
+    is timed per phase for ``/metrics`` and answered with a ``Server-Timing``
+    header. Profiled requests (see ``_profile_trigger``) get an
+    ``X-Profile-Id`` header.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        super().__init__(path, _with_array_encoding(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def decoding_handler(request: Request) -> Response:
+            floats = _JSON_FLOATS.set(json_float_options(request.query_params))
+            token = _RESPONSE_FORMAT.set(array_format(request.headers.get("accept")))
+            try:
+                fmt = array_format(request.headers.get("content-type"))
+                if fmt and self.body_field is not None:
+                    raw = await request.body()
+                    payload = {
+                        k: _query_value(v) for k, v in request.query_params.items()
+                    }
+                    payload["data"] = decode_array(raw, fmt)
+                    request = _DecodedArrayRequest(request, raw, payload)
+                return await handler(request)
+            finally:
+                _RESPONSE_FORMAT.reset(token)
+                _JSON_FLOATS.reset(floats)
+
+        inner = decoding_handler
+        if (PROFILING_ENABLED or PROFILE_SAMPLE_RATE > 0) and not self.path.startswith(
+            ("/metrics", "/profiles")
+        ):
+            inner = self._profiled(decoding_handler)
+        if not METRICS_ENABLED:
+            return inner
+
+        async def route_handler(request: Request) -> Response:
+            timings = {"start": time.perf_counter()}
+            token = _REQUEST_TIMINGS.set(timings)
+            _IN_FLIGHT["requests"] += 1
+            status = 500
+            try:
+                response = await inner(request)
+                status = response.status_code
+            except HTTPException as exc:
+                status = exc.status_code
+                raise
+            except RequestValidationError:
+                status = 422
+                raise
+            finally:
+                end = time.perf_counter()
+                _IN_FLIGHT["requests"] -= 1
+                _REQUEST_TIMINGS.reset(token)
+                REQUESTS_TOTAL.inc(request.method, self.path, status)
+                REQUEST_DURATION.observe(end - timings["start"], request.method, self.path)
+            phases = request_phases(timings, end)
+            for name, seconds in phases.items():
+                REQUEST_PHASES.observe(seconds, self.path, name)
+            size = request.headers.get("content-length")
+            if size and size.isdigit():
+                REQUEST_BYTES.observe(int(size), self.path)
+            body = getattr(response, "body", None)
+            if body is not None:
+                RESPONSE_BYTES.observe(len(body), self.path)
+            response.headers["Server-Timing"] = server_timing(phases, end - timings["start"])
+            return response
+
+        return route_handler
+
+    def _profiled(self, handler: Callable) -> Callable:
+        async def profiling_handler(request: Request) -> Response:
+            trigger = _profile_trigger(request)
+            if trigger is None:
+                return await handler(request)
+            profile = {
+                "id": uuid.uuid4().hex,
+                "method": request.method,
+                "endpoint": self.path,
+                "url": request.url.path,
+                "trigger": trigger,
+                "started": time.time(),
+                "interval": PROFILE_INTERVAL,
+            }
+            token = _PROFILE.set(profile)
+            try:
+                response = await handler(request)
+            finally:
+                _PROFILE.reset(token)
+                if "stacks" in profile:
+                    await run_in_threadpool(PROFILES.save, profile)
+            if "stacks" in profile:
+                response.headers["X-Profile-Id"] = profile["id"]
+            return response
+
+        return profiling_handler
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> Any:
+    start_warmup()
+    yield
+    JOBS.shutdown()
+    if get_explain_pool.loaded():
+        get_explain_pool().shutdown(cancel_futures=True)
+    if get_python_pool.loaded():
+        get_python_pool().close()
+    if _gigachat_client is not None:
+        await _gigachat_client[1].aclose()
+
+
+app = FastAPI(title="Cognitive Pipelines API", lifespan=lifespan)
+app.router.route_class = ArrayRoute
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-After-Id",
+        "X-Reducer-Id",
+        "Server-Timing",
+        "X-Profile-Id",
+    ],
 )
 
 DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "titanic.csv"
+EXPLAIN_MODEL_PATH = Path(
+    os.environ.get("EXPLAIN_MODEL_PATH", DATA_PATH.with_name("explain_model.pkl"))
+)
+
+
+@_lazy
+def get_dataset() -> Any:
+    """Return the Titanic DataFrame, reading the CSV on first use."""
+    pd = _pandas()
+
+    return pd.read_csv(DATA_PATH)
+
+
+DATASET_PARQUET_PATH = DATA_PATH.with_suffix(".parquet")
+
+
+@_lazy
+def get_dataset_table() -> Any:
+    """Return the Titanic dataset as a columnar Arrow table.
+
+    The table is read memory-mapped from a parquet copy of the CSV, which is
+    (re)written whenever it is missing or older than the CSV.
+    """
+    pa = _import_pyarrow()
+    import pyarrow.parquet as pq
+
+    try:
+        if DATASET_PARQUET_PATH.stat().st_mtime >= DATA_PATH.stat().st_mtime:
+            return pq.read_table(DATASET_PARQUET_PATH, memory_map=True)
+    except OSError:
+        pass
+    table = pa.Table.from_pandas(
+        get_dataset(), preserve_index=False
+    ).replace_schema_metadata(None)
+    try:
+        pq.write_table(table, DATASET_PARQUET_PATH)
+    except OSError as exc:
+        logger.warning("Could not cache dataset as parquet: %s", exc)
+    return table
 
-df = pd.read_csv(DATA_PATH)
 
 POSTGRES_USER = os.environ.get("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASSWORD", "postgres")
@@ -89,30 +1032,373 @@ DATABASE_URL = os.environ.get(
     "DATABASE_URL",
     f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}",
 )
-conn = psycopg2.connect(DATABASE_URL)
-with conn.cursor() as cur:
-    cur.execute(
-        "CREATE TABLE IF NOT EXISTS feedback (id SERIAL PRIMARY KEY, data JSONB)"
-    )
-    conn.commit()
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+DB_HEALTHCHECK_INTERVAL = float(os.environ.get("DB_HEALTHCHECK_INTERVAL", 30))
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of Postgres connections.
+
+    Callers block for up to ``timeout`` seconds when every connection is in
+    use. Connections idle for longer than ``healthcheck_interval`` are
+    probed with ``SELECT 1`` on checkout, and broken connections are
+    discarded and replaced, so the pool recovers from database restarts.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        minconn: int,
+        maxconn: int,
+        timeout: float,
+        healthcheck_interval: float,
+    ):
+        self._pool = _psycopg2().pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self._last_used: dict[int, float] = {}
+
+    def _healthy(self, conn: Any) -> bool:
+        psycopg2 = _psycopg2()
+
+        if conn.closed:
+            return False
+        idle = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _checkout(self) -> Any:
+        conn = self._pool.getconn()
+        if not self._healthy(conn):
+            logger.warning("Discarding broken database connection")
+            self._pool.putconn(conn, close=True)
+            conn = self._pool.getconn()
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Yield a connection and commit on success, roll back on error."""
+        psycopg2 = _psycopg2()
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HTTPException(status_code=503, detail="Database pool exhausted")
+        try:
+            try:
+                conn = self._checkout()
+            except psycopg2.OperationalError as exc:
+                raise HTTPException(
+                    status_code=503, detail=f"Database unavailable: {exc}"
+                )
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                if not conn.closed:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        pass
+                raise
+            finally:
+                if conn.closed:
+                    self._last_used.pop(id(conn), None)
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+
+
+
+def init_feedback_table(pool: ConnectionPool) -> None:
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS feedback (id SERIAL PRIMARY KEY, data JSONB)"
+        )
+        # expression indexes backing the min_likes / min_dislikes filters
+        for counter in ("likes", "dislikes"):
+            cur.execute(
+                f"CREATE INDEX IF NOT EXISTS feedback_{counter}_idx"
+                f" ON feedback (((data ->> '{counter}')::int))"
+            )
+
+
+@_lazy
+def get_db_pool() -> ConnectionPool:
+    """Connect to Postgres and create the feedback table on first use."""
+    psycopg2 = _psycopg2()
+
+    try:
+        pool = ConnectionPool(
+            DATABASE_URL,
+            DB_POOL_MIN,
+            DB_POOL_MAX,
+            DB_POOL_TIMEOUT,
+            DB_HEALTHCHECK_INTERVAL,
+        )
+    except psycopg2.OperationalError as exc:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {exc}")
+    init_feedback_table(pool)
+    return pool
+
 
 FEATURES = ["Pclass", "Sex", "Age", "SibSp", "Parch", "Fare"]
-_explain_df = df[FEATURES + ["Survived"]].dropna()
-_explain_df["Sex"] = _explain_df["Sex"].map({"male": 0, "female": 1})
-X_explain = _explain_df[FEATURES].values
-y_explain = _explain_df["Survived"].values
-from sklearn.ensemble import RandomForestClassifier
-_EXPLAIN_MODEL = RandomForestClassifier(n_estimators=50, random_state=0).fit(
-    X_explain, y_explain
-)
 
 
+def build_explain_model() -> Any:
+    """Train the default explain model on the Titanic data and persist it."""
+    import sklearn
+    from sklearn.ensemble import RandomForestClassifier
+
+    frame = get_dataset()[FEATURES + ["Survived"]].dropna()
+    frame["Sex"] = frame["Sex"].map({"male": 0, "female": 1})
+    model = RandomForestClassifier(n_estimators=50, random_state=0).fit(
+        frame[FEATURES].values, frame["Survived"].values
+    )
+    try:
+        with open(EXPLAIN_MODEL_PATH, "wb") as fh:
+            pickle.dump({"sklearn": sklearn.__version__, "model": model}, fh)
+    except OSError as exc:
+        logger.warning("Could not persist explain model: %s", exc)
+    return model
 
-class Matrix(BaseModel):
-    """Simple wrapper for a 2D list of floats and optional params."""
 
-    data: List[List[float]]
+@_lazy
+def get_explain_model() -> Any:
+    """Load the default explain model, retraining only if no usable artifact exists."""
+    import sklearn
+
+    try:
+        with open(EXPLAIN_MODEL_PATH, "rb") as fh:
+            artifact = pickle.load(fh)
+        if artifact.get("sklearn") == sklearn.__version__:
+            return artifact["model"]
+        logger.info("Explain model artifact built with another scikit-learn; retraining")
+    except FileNotFoundError:
+        pass
+    except Exception as exc:
+        logger.warning("Could not load explain model artifact: %s", exc)
+    return build_explain_model()
+
+
+def _warmup() -> None:
+    for name, load in (
+        ("dataset", get_dataset),
+        ("explain model", get_explain_model),
+        ("database", get_db_pool),
+        ("python workers", get_python_pool),
+    ):
+        try:
+            load()
+        except Exception as exc:
+            logger.warning("Warmup of %s failed: %s", name, exc)
+
+
+_warmup_thread: threading.Thread | None = None
+
+
+def start_warmup() -> None:
+    """Load lazy resources in a background thread (at most once at a time)."""
+    global _warmup_thread
+    if _warmup_thread is None or not _warmup_thread.is_alive():
+        _warmup_thread = threading.Thread(target=_warmup, name="warmup", daemon=True)
+        _warmup_thread.start()
+
+
+
+def _matrix_passthrough(value: Any, handler: Callable) -> Any:
+    # arrays decoded from binary payloads skip per-element validation
+    if isinstance(value, np.ndarray):
+        return value.reshape(-1, 1) if value.ndim == 1 else value
+    return handler(value)
+
+
+def _series_passthrough(value: Any, handler: Callable) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.reshape(-1)
+    return handler(value)
+
+
+MatrixData = Annotated[List[List[float]], WrapValidator(_matrix_passthrough)]
+SeriesData = Annotated[List[float], WrapValidator(_series_passthrough)]
+
+
+class MatrixSource(BaseModel):
+    """Matrix given inline as ``data`` or by reference to an uploaded dataset.
+
+    ``{"dataset": id, "columns": [...]}`` loads the listed columns (all
+    numeric ones when omitted) of a dataset created with ``POST /datasets``.
+    """
+
+    data: MatrixData | None = None
+    dataset: str | None = None
+    columns: List[str] | None = None
+
+    @model_validator(mode="after")
+    def _load_dataset(self) -> "MatrixSource":
+        if self.dataset is not None:
+            if self.data is not None:
+                raise ValueError("Pass either data or dataset, not both")
+            self.data = DATASETS.matrix(self.dataset, self.columns)
+        elif self.data is None:
+            raise ValueError("Either data or dataset is required")
+        return self
+
+
+class Matrix(MatrixSource):
+    """Simple wrapper for a 2D list of floats and optional params.
+
+    ``cache`` can be set to ``False`` to bypass the shared result cache and
+    force a fresh computation.
+    """
+
     params: dict | None = None
+    cache: bool = True
+
+
+def _result_nbytes(value: Any) -> int:
+    """Estimate the memory footprint of a cached result."""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(_result_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_result_nbytes(v) for v in value) + 8 * len(value)
+    return sys.getsizeof(value)
+
+
+def _freeze_arrays(value: Any) -> None:
+    """Mark every array inside ``value`` read-only."""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _freeze_arrays(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _freeze_arrays(v)
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by the total size of stored results.
+
+    Values are kept as numpy arrays (or containers of them) rather than the
+    nested lists sent to clients, so the byte budget reflects real memory use.
+    Arrays are marked read-only because the same object is handed to every
+    request that hits the entry.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any, nbytes: int | None = None) -> None:
+        if nbytes is None:
+            nbytes = _result_nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+        _freeze_arrays(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+RESULT_CACHE = ResultCache(
+    int(os.environ.get("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+)
+
+
+def array_digest(data: np.ndarray) -> str:
+    """Hash the canonical (C-contiguous float64) bytes of ``data``."""
+    arr = np.ascontiguousarray(data, dtype=float)
+    h = hashlib.sha256()
+    h.update(str(arr.shape).encode())
+    h.update(arr)
+    return h.hexdigest()
+
+
+def result_cache_key(endpoint: str, data: np.ndarray, params: dict) -> str:
+    """Build a content-addressed cache key for an analytics request."""
+    h = hashlib.sha256()
+    h.update(endpoint.encode())
+    h.update(array_digest(data).encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def cached_compute(
+    endpoint: str,
+    data: np.ndarray,
+    params: dict,
+    compute: Callable[[], Any],
+    enabled: bool = True,
+) -> Any:
+    """Return ``compute()`` memoized in :data:`RESULT_CACHE`.
+
+    ``params`` must already be normalized so that equivalent requests share
+    an entry. When ``enabled`` is false the cache is neither read nor written.
+    """
+    if not enabled:
+        with timed_phase("fit"):
+            return compute()
+    key = result_cache_key(endpoint, data, params)
+    result = RESULT_CACHE.get(key)
+    if result is None:
+        with timed_phase("fit"):
+            result = compute()
+        RESULT_CACHE.put(key, result)
+    return result
 
 
 class TableData(BaseModel):
@@ -124,6 +1410,7 @@ class TableData(BaseModel):
 class CodeRequest(BaseModel):
     code: str
     data: Any | None = None
+    session: str | None = None
 
 
 
@@ -152,9 +1439,17 @@ def somProjection(data: np.ndarray, grid_size: int) -> list[list[int]]:
     som.train_random(data, 100)
     return [list(som.winner(x)) for x in data]
 
-class ExplainRequest(BaseModel):
+class ExplainRequest(MatrixSource):
+    """Rows to explain with the default or a registered model.
+
+    ``approximate`` uses the fast Saabas attribution instead of exact Tree
+    SHAP. ``layout="columnar"`` returns ``{"features": [...], "values":
+    matrix}`` instead of a list of feature/contribution records per row.
+    """
+
     model: str | None = None
-    data: List[List[float]]
+    approximate: bool = False
+    layout: Literal["records", "columnar"] = "records"
 
 
 class RFTrainRequest(BaseModel):
@@ -167,6 +1462,12 @@ class RFPredictRequest(BaseModel):
     data: List[List[float]]
 
 
+class TransformRequest(MatrixSource):
+    """New rows to embed with a reducer persisted by ``?persist=true``."""
+
+    reducer: str
+
+
 class CopilotRequest(BaseModel):
     question: str
     model: str
@@ -180,6 +1481,11 @@ class CopilotRequest(BaseModel):
         default=None,
         description="Descriptions of nodes including allowed inputs and outputs",
     )
+    conversation: str | None = Field(
+        default=None,
+        description="Id grouping the turns of one conversation; later turns send "
+        "only what changed",
+    )
 
 
 DEFAULT_COPILOT_PROMPTS: dict[str, str] = {
@@ -332,7 +1638,7 @@ GENERATION_EXAMPLES = [
 class Series(BaseModel):
     """Wrapper for a list of numeric values."""
 
-    data: List[float]
+    data: SeriesData
     params: dict | None = None
 
 def detectAnchoring(values: np.ndarray) -> float:
@@ -372,12 +1678,24 @@ class PaletteParams(BaseModel):
     chroma: float = 40.0
 
       
-class ImshowRequest(BaseModel):
-    data: List[List[float]]
+class PyramidRequest(MatrixSource):
+    tile_size: int = Field(256, ge=16, le=2048)
+
+
+class ImshowRequest(MatrixSource):
+    """Heatmap rendering options.
+
+    ``size`` is the length in pixels of the longer image side (defaults to
+    ``IMSHOW_SIZE``). ``format="png"`` returns raw PNG bytes instead of a
+    data URL.
+    """
+
     cmap: str = "viridis"
     interpolation: str = "nearest"
     vmin: float | None = None
     vmax: float | None = None
+    size: int | None = Field(None, ge=1, le=4096)
+    format: Literal["data_url", "png"] = "data_url"
 
 
 
@@ -387,44 +1705,606 @@ def health() -> dict:
     return {"status": "ok"}
 
 
-@app.get("/passengers")
-def passengers(limit: int = 10) -> list[dict]:
-    """Return a sample of Titanic passenger records.
+@app.get("/ready")
+def ready() -> Any:
+    """Readiness probe: 200 once the dataset, explain model and database are up.
 
-    Args:
-        limit: Number of rows to return.
+    Unlike ``/health`` this reflects whether requests can actually be served.
+    A probe that finds the service cold (re)starts the background warmup.
     """
-    return df.head(limit).to_dict(orient="records")
+    status = {
+        "dataset": get_dataset.loaded(),
+        "explain_model": get_explain_model.loaded(),
+        "database": False,
+    }
+    if get_db_pool.loaded():
+        try:
+            with get_db_pool().connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            status["database"] = True
+        except Exception as exc:
+            logger.warning("Readiness database check failed: %s", exc)
+    if not all(status.values()):
+        start_warmup()
+        return JSONResponse(status_code=503, content={"status": "starting", **status})
+    return {"status": "ready", **status}
 
 
-@app.post("/describe")
-def describe_table(req: TableData) -> dict:
-    """Return descriptive statistics for arbitrary table-like data."""
-    try:
-        frame = pd.DataFrame(req.data)
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
+@app.get("/cache")
+def cache_stats() -> dict:
+    """Return hit/miss counters and memory usage of the result cache."""
+    return RESULT_CACHE.stats()
+
+
+@app.delete("/cache")
+def cache_clear() -> dict:
+    """Drop every entry from the result cache."""
+    RESULT_CACHE.clear()
+    return {"status": "ok"}
+
+
+def _gauge(name: str, doc: str, samples: list[tuple[str, float]]) -> list[str]:
+    lines = [f"# HELP {name} {doc}", f"# TYPE {name} gauge"]
+    lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+    return lines
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Expose request, threadpool and cache metrics in Prometheus text format."""
+    import anyio.to_thread
+
+    limiter = anyio.to_thread.current_default_thread_limiter().statistics()
+    caches = {
+        "result": RESULT_CACHE,
+        "nn_graph": NN_GRAPHS,
+        "imshow_pyramid": IMSHOW_PYRAMIDS,
+        "imshow_tile": IMSHOW_TILES,
+        "copilot_image": COPILOT_IMAGES,
+    }
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    lines = [
+        *_gauge(
+            "http_requests_in_flight",
+            "Requests currently being handled.",
+            [("", _IN_FLIGHT["requests"])],
+        ),
+        *_gauge(
+            "threadpool_workers_busy",
+            "Threadpool tokens held by running sync endpoints and dependencies.",
+            [("", limiter.borrowed_tokens)],
+        ),
+        *_gauge("threadpool_workers", "Threadpool size.", [("", limiter.total_tokens)]),
+        *_gauge(
+            "threadpool_queue_depth",
+            "Tasks waiting for a threadpool worker.",
+            [("", limiter.tasks_waiting)],
+        ),
+    ]
+    for key, kind, doc in (
+        ("hits", "counter", "Cache lookups that found an entry."),
+        ("misses", "counter", "Cache lookups that found nothing."),
+        ("evictions", "counter", "Entries dropped to stay within the byte budget."),
+        ("entries", "gauge", "Entries currently cached."),
+        ("bytes", "gauge", "Estimated size of the cached entries."),
+        ("hit_rate", "gauge", "Fraction of lookups that were hits."),
+    ):
+        name = f"cache_{key}_total" if kind == "counter" else f"cache_{key}"
+        lines.append(f"# HELP {name} {doc}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f'{name}{{cache="{c}"}} {s[key]}' for c, s in stats.items())
+    for metric in (
+        REQUESTS_TOTAL,
+        REQUEST_DURATION,
+        REQUEST_PHASES,
+        REQUEST_BYTES,
+        RESPONSE_BYTES,
+    ):
+        lines.extend(metric.render())
+    return Response(
+        "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/profiles")
+def list_profiles() -> list[dict]:
+    """List stored request profiles, newest first, without their stacks."""
+    return PROFILES.list()
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile(
+    profile_id: str,
+    layout: Literal["speedscope", "collapsed"] = Query("speedscope", alias="format"),
+) -> Any:
+    """Return a request profile as speedscope JSON or collapsed stacks.
+
+    Collapsed stacks (one ``frame;frame;frame count`` line per stack) can be
+    fed to ``flamegraph.pl``; the speedscope file opens at speedscope.app.
+    """
+    profile = PROFILES.get(profile_id)
+    if layout == "collapsed":
+        lines = [f"{stack} {count}" for stack, count in profile["stacks"].items()]
+        return Response("\n".join(lines) + "\n", media_type="text/plain")
+    return speedscope_profile(profile)
+
+
+_FILTER_OPS = {
+    ">=": "greater_equal",
+    "<=": "less_equal",
+    "!=": "not_equal",
+    "==": "equal",
+    "=": "equal",
+    ">": "greater",
+    "<": "less",
+}
+
+
+def parse_filter(expr: str) -> tuple[str, str, Any]:
+    """Split ``"Age>=30"`` into ``("Age", "greater_equal", 30)``.
+
+    Values are decoded as JSON when possible and otherwise kept as strings,
+    so ``Sex=female`` and ``Sex="female"`` are equivalent.
+    """
+    for op, func in _FILTER_OPS.items():
+        column, sep, raw = expr.partition(op)
+        if sep and column:
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                value = raw
+            return column.strip(), func, value
+    raise HTTPException(status_code=400, detail=f"Invalid filter {expr!r}")
+
+
+def query_table(
+    table: Any,
+    columns: list[str] | None = None,
+    filters: list[str] | None = None,
+    sort: list[str] | None = None,
+    sample: int | None = None,
+    seed: int | None = None,
+    offset: int = 0,
+    limit: int | None = None,
+) -> Any:
+    """Filter, sample, sort, page and project an Arrow table.
+
+    Steps run in that order; ``sort`` entries prefixed with ``-`` sort
+    descending. Unknown columns and incompatible filter values raise 400.
+    """
+    pa = _import_pyarrow()
+    import pyarrow.compute as pc
+
+    def check(name: str) -> str:
+        if name not in table.column_names:
+            raise HTTPException(status_code=400, detail=f"Unknown column {name}")
+        return name
+
+    try:
+        for expr in filters or []:
+            column, func, value = parse_filter(expr)
+            mask = getattr(pc, func)(table[check(column)], pa.scalar(value))
+            table = table.filter(pc.fill_null(mask, False))
+        if sample is not None and sample < table.num_rows:
+            rng = np.random.default_rng(seed)
+            table = table.take(np.sort(rng.choice(table.num_rows, sample, replace=False)))
+        if sort:
+            keys = [
+                (check(key[1:]), "descending") if key.startswith("-") else (check(key), "ascending")
+                for key in sort
+            ]
+            table = table.sort_by(keys)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    table = table.slice(offset, limit)
+    if columns:
+        table = table.select([check(c) for c in columns])
+    return table
+
+
+def table_response(table: Any, layout: str, accept: str | None) -> Any:
+    """Serialize an Arrow table as records, columns or an Arrow IPC stream."""
+    if layout == "arrow" or array_format(accept) == "arrow":
+        pa = _import_pyarrow()
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(
+            sink.getvalue().to_pybytes(), media_type=ARRAY_MEDIA_TYPES["arrow"]
+        )
+    if layout == "columns":
+        return table.to_pydict()
+    return table.to_pylist()
+
+
+def _split_param(values: list[str] | None) -> list[str] | None:
+    if not values:
+        return None
+    return [v.strip() for item in values for v in item.split(",") if v.strip()]
+
+
+def table_query(
+    limit: int | None = Query(10, ge=0),
+    offset: int = Query(0, ge=0),
+    columns: List[str] | None = Query(None),
+    filters: List[str] | None = Query(None, alias="filter"),
+    sort: List[str] | None = Query(None),
+    sample: int | None = Query(None, ge=0),
+    seed: int | None = None,
+) -> dict:
+    """Collect the shared table query parameters as ``query_table`` kwargs.
+
+    Args:
+        limit: Maximum number of rows to return.
+        offset: Number of rows to skip.
+        columns: Columns to return (repeated or comma separated).
+        filter: Predicates such as ``Age>30`` or ``Sex=female``; all must hold.
+        sort: Columns to sort by, ``-`` prefix for descending.
+        sample: Draw this many random rows (reproducible with ``seed``).
+    """
+    return {
+        "columns": _split_param(columns),
+        "filters": filters,
+        "sort": _split_param(sort),
+        "sample": sample,
+        "seed": seed,
+        "offset": offset,
+        "limit": limit,
+    }
+
+
+@app.get("/passengers")
+def passengers(
+    query: dict = Depends(table_query),
+    layout: Literal["records", "columns", "arrow"] = Query("records", alias="format"),
+    accept: str | None = Header(None),
+) -> list[dict] | dict:
+    """Query Titanic passenger records.
+
+    See ``table_query`` for the filtering parameters; ``format`` selects
+    ``records``, column-oriented ``columns`` or binary ``arrow`` output.
+    """
+    return table_response(query_table(get_dataset_table(), **query), layout, accept)
+
+
+DATASET_DIR = Path(os.environ.get("DATASET_DIR", DATA_PATH.with_name("datasets")))
+DATASET_MAX_BYTES = int(os.environ.get("DATASET_MAX_BYTES", 1 << 30))
+DATASET_STORE_BYTES = int(os.environ.get("DATASET_STORE_BYTES", 8 << 30))
+DATASET_TTL = float(os.environ.get("DATASET_TTL", 7 * 24 * 3600))
+
+
+class DatasetStore:
+    """Uploaded datasets kept as memory-mapped Arrow IPC files.
+
+    Uploads are converted batch by batch, so neither the raw upload nor the
+    converted table has to fit in memory. Opened tables are memory-mapped
+    and shared by every request that references the dataset. Datasets
+    unused for ``ttl`` seconds are removed, and the least recently used ones
+    go first once the files exceed ``max_bytes`` in total.
+    """
+
+    _PURGE_INTERVAL = 60.0
+
+    def __init__(self, directory: Path, max_bytes: int, ttl: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._tables: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _purge(self, force: bool = False, keep: str | None = None) -> None:
+        now = time.time()
+        if not force and now - self._last_purge < self._PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        files = []
+        for path in self.directory.glob("*.arrow"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for used, size, path in files:
+            if now - used <= self.ttl and total <= self.max_bytes:
+                break
+            if path.stem == keep:
+                continue
+            with self._lock:
+                self._tables.pop(path.stem, None)
+            # tables already handed out keep their memory map
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def _path(self, dataset_id: str) -> Path:
+        if not is_opaque_id(dataset_id):
+            raise HTTPException(status_code=404, detail="Dataset not found")
+        return self.directory / f"{dataset_id}.arrow"
+
+    def create(self, upload: Path, fmt: str) -> str:
+        """Convert an uploaded CSV or parquet file and return its dataset id."""
+        pa = _import_pyarrow()
+        import pyarrow.csv
+        import pyarrow.parquet as pq
+
+        dataset_id = uuid.uuid4().hex
+        target = self._path(dataset_id)
+        partial = target.with_suffix(".partial")
+        try:
+            if fmt == "parquet":
+                source = pq.ParquetFile(upload)
+                schema, batches = source.schema_arrow, source.iter_batches()
+            else:
+                reader = pyarrow.csv.open_csv(upload)
+                schema, batches = reader.schema, reader
+            with pa.OSFile(str(partial), "wb") as sink:
+                with pa.ipc.new_file(sink, schema) as writer:
+                    for batch in batches:
+                        writer.write_batch(batch)
+        except (pa.ArrowException, OSError) as exc:
+            partial.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail=f"Invalid {fmt} upload: {exc}")
+        partial.rename(target)
+        self._purge(force=True, keep=dataset_id)
+        return dataset_id
+
+    def table(self, dataset_id: str) -> Any:
+        pa = _import_pyarrow()
+        path = self._path(dataset_id)
+        self._purge()
+        try:
+            # the modification time records the last use for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            table = self._tables.get(dataset_id)
+            if table is None:
+                try:
+                    source = pa.memory_map(str(path))
+                except FileNotFoundError:
+                    raise HTTPException(status_code=404, detail="Dataset not found")
+                table = pa.ipc.open_file(source).read_all()
+                self._tables[dataset_id] = table
+        return table
+
+    def matrix(self, dataset_id: str, columns: list[str] | None = None) -> np.ndarray:
+        """Return the given columns (by default the numeric ones) as a float matrix."""
+        pa = _import_pyarrow()
+        table = self.table(dataset_id)
+        if columns is None:
+            columns = [
+                field.name
+                for field in table.schema
+                if pa.types.is_integer(field.type)
+                or pa.types.is_floating(field.type)
+                or pa.types.is_boolean(field.type)
+            ]
+        if not columns:
+            return np.empty((table.num_rows, 0))
+        table = query_table(table, columns=columns)
+        try:
+            arrays = [
+                np.asarray(column.to_numpy(), dtype=float) for column in table.columns
+            ]
+        except (ValueError, TypeError) as exc:
+            raise HTTPException(status_code=400, detail=f"Non-numeric column: {exc}")
+        return np.column_stack(arrays)
+
+    def describe(self, dataset_id: str) -> dict:
+        table = self.table(dataset_id)
+        return {
+            "dataset": dataset_id,
+            "rows": table.num_rows,
+            "columns": [
+                {"name": field.name, "type": str(field.type)} for field in table.schema
+            ],
+        }
+
+    def delete(self, dataset_id: str) -> None:
+        path = self._path(dataset_id)
+        with self._lock:
+            self._tables.pop(dataset_id, None)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Dataset not found")
+
+
+DATASETS = DatasetStore(DATASET_DIR, DATASET_STORE_BYTES, DATASET_TTL)
+
+
+@app.post("/datasets", status_code=201)
+async def upload_dataset(
+    request: Request,
+    fmt: Literal["csv", "parquet"] | None = Query(None, alias="format"),
+) -> dict:
+    """Store a streamed CSV or parquet upload and return its dataset id.
+
+    The request body is the raw file; chunked transfer encoding is fine.
+    The format is taken from ``format``, the content type or the parquet
+    magic bytes, defaulting to CSV.
+    """
+    DATASET_DIR.mkdir(parents=True, exist_ok=True)
+    upload = DATASET_DIR / f"{uuid.uuid4().hex}.upload"
+    size = 0
+    try:
+        with open(upload, "wb") as fh:
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                if fmt is None:
+                    content_type = request.headers.get("content-type", "")
+                    is_parquet = "parquet" in content_type or chunk[:4] == b"PAR1"
+                    fmt = "parquet" if is_parquet else "csv"
+                size += len(chunk)
+                if size > DATASET_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="Dataset too large")
+                fh.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        dataset_id = await run_in_threadpool(DATASETS.create, upload, fmt)
+    finally:
+        upload.unlink(missing_ok=True)
+    return DATASETS.describe(dataset_id)
+
+
+@app.get("/datasets/{dataset_id}")
+def describe_dataset(dataset_id: str) -> dict:
+    """Return the row count and schema of an uploaded dataset."""
+    return DATASETS.describe(dataset_id)
+
+
+@app.get("/datasets/{dataset_id}/rows")
+def dataset_rows(
+    dataset_id: str,
+    query: dict = Depends(table_query),
+    layout: Literal["records", "columns", "arrow"] = Query("records", alias="format"),
+    accept: str | None = Header(None),
+) -> list[dict] | dict:
+    """Query rows of an uploaded dataset like ``/passengers``."""
+    return table_response(query_table(DATASETS.table(dataset_id), **query), layout, accept)
+
+
+@app.delete("/datasets/{dataset_id}")
+def delete_dataset(dataset_id: str) -> dict:
+    """Remove an uploaded dataset."""
+    DATASETS.delete(dataset_id)
+    return {"status": "ok"}
+
+
+@app.post("/describe")
+def describe_table(req: TableData) -> dict:
+    """Return descriptive statistics for arbitrary table-like data."""
+    pd = _pandas()
+
+    try:
+        frame = pd.DataFrame(req.data)
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     return frame.describe(include="all").replace({np.nan: None}).to_dict()
 
 
 
-@app.get("/feedback")
-def get_feedback() -> list[dict]:
-    """Return all stored feedback entries including their ids."""
-    with conn.cursor() as cur:
-        cur.execute("SELECT id, data FROM feedback ORDER BY id")
+def _feedback_query(
+    after_id: int | None,
+    limit: int | None,
+    min_likes: int | None,
+    min_dislikes: int | None,
+) -> tuple[str, dict]:
+    """Build the keyset-paginated feedback query and its parameters."""
+    clauses = []
+    if after_id is not None:
+        clauses.append("id > %(after_id)s")
+    if min_likes is not None:
+        clauses.append("(data ->> 'likes')::int >= %(min_likes)s")
+    if min_dislikes is not None:
+        clauses.append("(data ->> 'dislikes')::int >= %(min_dislikes)s")
+    query = "SELECT id, data FROM feedback"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY id"
+    if limit is not None:
+        query += " LIMIT %(limit)s"
+    params = {
+        "after_id": after_id,
+        "limit": limit,
+        "min_likes": min_likes,
+        "min_dislikes": min_dislikes,
+    }
+    return query, params
+
+
+def fetch_feedback(
+    after_id: int | None = None,
+    limit: int | None = None,
+    min_likes: int | None = None,
+    min_dislikes: int | None = None,
+) -> list[dict]:
+    """Return feedback entries with ids greater than ``after_id``."""
+    query, params = _feedback_query(after_id, limit, min_likes, min_dislikes)
+    with get_db_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
         rows = cur.fetchall()
     return [{"id": r[0], "data": r[1]} for r in rows]
 
 
+# each stream holds a pooled connection until the client has read everything
+FEEDBACK_STREAM_LIMIT = int(
+    os.environ.get("FEEDBACK_STREAM_LIMIT", max(DB_POOL_MAX // 2, 1))
+)
+_feedback_streams = threading.BoundedSemaphore(FEEDBACK_STREAM_LIMIT)
+
+
+def stream_feedback(
+    after_id: int | None = None,
+    min_likes: int | None = None,
+    min_dislikes: int | None = None,
+) -> Iterator[bytes]:
+    """Yield feedback entries as NDJSON lines from a server-side cursor.
+
+    Rows are fetched in batches of ``itersize`` so memory use does not depend
+    on the size of the table. The caller must hold a ``_feedback_streams``
+    slot; it is released once the generator has started and then finishes or
+    is closed. The first item is an empty chunk yielded once the query has
+    run, so priming the generator surfaces database errors before streaming.
+    """
+    try:
+        query, params = _feedback_query(after_id, None, min_likes, min_dislikes)
+        with get_db_pool().connection() as conn:
+            with conn.cursor(name=f"feedback_{uuid.uuid4().hex}") as cur:
+                cur.itersize = 1000
+                cur.execute(query, params)
+                yield b""
+                for fb_id, data in cur:
+                    yield (json.dumps({"id": fb_id, "data": data}) + "\n").encode()
+    finally:
+        _feedback_streams.release()
+
+
+@app.get("/feedback", response_model=None)
+def get_feedback(
+    response: Response,
+    after_id: int | None = None,
+    limit: Annotated[int | None, Query(ge=1)] = None,
+    min_likes: int | None = None,
+    min_dislikes: int | None = None,
+    stream: bool = False,
+    accept: Annotated[str | None, Header()] = None,
+) -> list[dict] | StreamingResponse:
+    """Return stored feedback entries including their ids.
+
+    Pages are selected with ``after_id`` (the last id already seen) and
+    ``limit``; when a page is full the ``X-Next-After-Id`` header holds the
+    cursor for the next one. With ``stream=true`` or an
+    ``application/x-ndjson`` Accept header all matching entries are streamed
+    as newline-delimited JSON instead. A stream keeps a database connection
+    for as long as the client reads, so at most ``FEEDBACK_STREAM_LIMIT``
+    run at once and further ones are answered with 503.
+    """
+    if stream or (accept and "application/x-ndjson" in accept):
+        if not _feedback_streams.acquire(blocking=False):
+            raise HTTPException(status_code=503, detail="Too many feedback streams")
+        lines = stream_feedback(after_id, min_likes, min_dislikes)
+        next(lines)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+    entries = fetch_feedback(after_id, limit, min_likes, min_dislikes)
+    if limit is not None and len(entries) == limit:
+        response.headers["X-Next-After-Id"] = str(entries[-1]["id"])
+    return entries
+
+
 @app.post("/feedback")
 def save_feedback(feedback: str = Body(..., media_type="text/plain")) -> dict:
     """Store a feedback message sent as plain text."""
     # initialize feedback entry with like / dislike counters
     entry = {"message": feedback, "likes": 0, "dislikes": 0}
-    with conn.cursor() as cur:
-        cur.execute("INSERT INTO feedback (data) VALUES (%s)", [Json(entry)])
-        conn.commit()
+    with get_db_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO feedback (data) VALUES (%s)", [_psycopg2().extras.Json(entry)]
+        )
     return {"status": "ok"}
 
 
@@ -438,27 +2318,163 @@ def set_feedback_reaction(fb_id: int, react: Reaction) -> dict:
     reaction = react.reaction
     if reaction not in {"like", "dislike"}:
         raise HTTPException(status_code=400, detail="Invalid reaction")
-    with conn.cursor() as cur:
-        cur.execute("SELECT data FROM feedback WHERE id = %s", [fb_id])
+    counter = "likes" if reaction == "like" else "dislikes"
+    # a single UPDATE increments the counter atomically, so concurrent
+    # reactions cannot overwrite each other
+    with get_db_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE feedback
+            SET data = jsonb_set(
+                COALESCE(data, '{}'::jsonb),
+                ARRAY[%(counter)s],
+                to_jsonb(COALESCE((data ->> %(counter)s)::int, 0) + 1)
+            )
+            WHERE id = %(id)s
+            RETURNING COALESCE((data ->> 'likes')::int, 0),
+                      COALESCE((data ->> 'dislikes')::int, 0)
+            """,
+            {"counter": counter, "id": fb_id},
+        )
         row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Feedback not found")
-        data = row[0]
-        likes = int(data.get("likes", 0))
-        dislikes = int(data.get("dislikes", 0))
-        if reaction == "like":
-            likes += 1
-        else:
-            dislikes += 1
-        data.update({"likes": likes, "dislikes": dislikes})
-        cur.execute("UPDATE feedback SET data = %s WHERE id = %s", [Json(data), fb_id])
-        conn.commit()
+    if not row:
+        raise HTTPException(status_code=404, detail="Feedback not found")
+    likes, dislikes = row
     return {"status": "ok", "likes": likes, "dislikes": dislikes}
 
 
+MODEL_STORE_DIR = Path(
+    os.environ.get("MODEL_STORE_DIR", DATA_PATH.with_name("models"))
+)
+MODEL_CACHE_SIZE = int(os.environ.get("MODEL_CACHE_SIZE", 16))
+MODEL_TTL = float(os.environ.get("MODEL_TTL", 24 * 3600))
+
+
+class ModelStore:
+    """Registry of trained models addressed by opaque ids.
+
+    Recently used models stay deserialized in an in-memory LRU of
+    ``capacity`` entries. Every model is also written to ``directory`` with
+    joblib, so models evicted from memory are reloaded (with their arrays
+    memory-mapped) on demand. Models unused for ``ttl`` seconds are removed
+    from memory and disk.
+    """
+
+    _PURGE_INTERVAL = 60.0
+
+    def __init__(self, directory: Path, capacity: int, ttl: float):
+        self.directory = directory
+        self.capacity = capacity
+        self.ttl = ttl
+        self._hot: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _path(self, model_id: str) -> Path:
+        return self.directory / f"{model_id}.joblib"
+
+    def _remember(self, model_id: str, model: Any) -> None:
+        # caller holds the lock
+        self._hot[model_id] = (model, time.time())
+        self._hot.move_to_end(model_id)
+        while len(self._hot) > self.capacity:
+            evicted, (_, last_used) = self._hot.popitem(last=False)
+            try:
+                os.utime(self._path(evicted), (last_used, last_used))
+            except OSError:
+                pass
+
+    def _purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge < self._PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        with self._lock:
+            for model_id in [
+                mid for mid, (_, used) in self._hot.items() if now - used > self.ttl
+            ]:
+                del self._hot[model_id]
+            hot = set(self._hot)
+        for path in self.directory.glob("*.joblib"):
+            try:
+                if path.stem not in hot and now - path.stat().st_mtime > self.ttl:
+                    path.unlink()
+            except OSError:
+                pass
+
+    def put(self, model: Any) -> str:
+        import joblib
+
+        self._purge()
+        model_id = uuid.uuid4().hex
+        self.directory.mkdir(parents=True, exist_ok=True)
+        joblib.dump(model, self._path(model_id))
+        with self._lock:
+            self._remember(model_id, model)
+        return model_id
+
+    def get(self, model_id: str) -> Any:
+        import joblib
+
+        self._purge()
+        with self._lock:
+            entry = self._hot.get(model_id)
+            if entry is not None:
+                self._remember(model_id, entry[0])
+                return entry[0]
+        if not is_opaque_id(model_id):
+            raise HTTPException(status_code=404, detail="Model not found")
+        try:
+            model = joblib.load(self._path(model_id), mmap_mode="r")
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Model not found")
+        with self._lock:
+            self._remember(model_id, model)
+        return model
+
+    def delete(self, model_id: str) -> bool:
+        with self._lock:
+            found = self._hot.pop(model_id, None) is not None
+        if is_opaque_id(model_id):
+            try:
+                self._path(model_id).unlink()
+                found = True
+            except FileNotFoundError:
+                pass
+        return found
+
+
+MODEL_STORE = ModelStore(MODEL_STORE_DIR, MODEL_CACHE_SIZE, MODEL_TTL)
+
+
+def resolve_model(ref: str) -> Any:
+    """Return the model for a registry id or a legacy base64 pickle.
+
+    The store also holds fitted reducers; their ids are rejected with 400.
+    """
+    from sklearn.base import is_classifier, is_regressor
+
+    if is_opaque_id(ref):
+        model = MODEL_STORE.get(ref)
+    else:
+        try:
+            model = pickle.loads(base64.b64decode(ref.encode("ascii")))
+        except Exception as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    if not (is_classifier(model) or is_regressor(model)):
+        raise HTTPException(
+            status_code=400, detail=f"{ref} is not a classifier or regressor"
+        )
+    return model
+
+
 @app.post("/rf_train")
 def rf_train(req: RFTrainRequest) -> dict:
-    """Train a RandomForest model and return it serialized."""
+    """Train a RandomForest model and register it in the model store.
+
+    The returned ``model`` is an opaque id accepted by ``/rf_predict`` and
+    ``/explain``.
+    """
     from sklearn.ensemble import RandomForestClassifier
 
     try:
@@ -469,22 +2485,16 @@ def rf_train(req: RFTrainRequest) -> dict:
     model = RandomForestClassifier(n_estimators=100, random_state=0).fit(
         data, target
     )
-    model_bytes = pickle.dumps(model)
-    model_str = base64.b64encode(model_bytes).decode("ascii")
     return {
-        "model": model_str,
+        "model": MODEL_STORE.put(model),
         "importance": model.feature_importances_.tolist(),
     }
 
 
 @app.post("/rf_predict")
 def rf_predict(req: RFPredictRequest) -> list[float]:
-    """Run predictions using a serialized RandomForest model."""
-    try:
-        model_bytes = base64.b64decode(req.model.encode("ascii"))
-        model = pickle.loads(model_bytes)
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
+    """Run predictions using a registered RandomForest model."""
+    model = resolve_model(req.model)
     try:
         data = np.asarray(req.data, dtype=float)
     except (ValueError, TypeError) as exc:
@@ -493,18 +2503,91 @@ def rf_predict(req: RFPredictRequest) -> list[float]:
     return preds.tolist()
 
 
+@app.delete("/models/{model_id}")
+def delete_model(model_id: str) -> dict:
+    """Remove a registered model from memory and disk."""
+    if not MODEL_STORE.delete(model_id):
+        raise HTTPException(status_code=404, detail="Model not found")
+    with _EXPLAINERS_LOCK:
+        _EXPLAINERS.pop(model_id, None)
+    return {"status": "ok"}
+
+
+EXPLAINER_CACHE_SIZE = int(os.environ.get("EXPLAINER_CACHE_SIZE", 8))
+EXPLAIN_BATCH_ROWS = int(os.environ.get("EXPLAIN_BATCH_ROWS", 2048))
+EXPLAIN_WORKERS = int(os.environ.get("EXPLAIN_WORKERS", min(4, os.cpu_count() or 1)))
+
+_EXPLAINERS: OrderedDict[str, Any] = OrderedDict()
+_EXPLAINERS_LOCK = threading.Lock()
+
+
+def get_explainer(model_ref: str | None) -> Any:
+    """Return a cached ``TreeExplainer`` for the default or a given model.
+
+    Explainers are keyed by the registry id (or a digest of a legacy pickled
+    blob), so repeated requests against the same model skip rebuilding it.
+    """
+    import shap
+
+    if not model_ref:
+        key = "default"
+    elif is_opaque_id(model_ref):
+        key = model_ref
+    else:
+        key = hashlib.sha256(model_ref.encode("ascii", "replace")).hexdigest()
+    with _EXPLAINERS_LOCK:
+        explainer = _EXPLAINERS.get(key)
+        if explainer is not None:
+            _EXPLAINERS.move_to_end(key)
+            return explainer
+    model = resolve_model(model_ref) if model_ref else get_explain_model()
+    explainer = shap.TreeExplainer(model)
+    with _EXPLAINERS_LOCK:
+        _EXPLAINERS[key] = explainer
+        while len(_EXPLAINERS) > EXPLAINER_CACHE_SIZE:
+            _EXPLAINERS.popitem(last=False)
+    return explainer
+
+
+def shap_contributions(
+    model_ref: str | None, data: np.ndarray, approximate: bool = False
+) -> np.ndarray:
+    """Return positive-class SHAP values as an ``(n_rows, n_features)`` array."""
+    explainer = get_explainer(model_ref)
+    values = explainer.shap_values(data, approximate=approximate)
+    if isinstance(values, list):
+        values = values[1]
+    elif getattr(values, "ndim", 0) == 3:
+        values = values[..., 1]
+    return np.asarray(values, dtype=float)
+
+
+def _explain_chunk(
+    model_ref: str | None, data: np.ndarray, approximate: bool
+) -> np.ndarray:
+    """Explain one batch inside a pool worker, reusing its explainer cache."""
+    try:
+        return shap_contributions(model_ref, data, approximate)
+    except HTTPException as exc:
+        raise ValueError(exc.detail) from None
+
+
+@_lazy
+def get_explain_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=EXPLAIN_WORKERS, mp_context=_process_context())
+
+
 @app.post("/explain")
-def explain(req: ExplainRequest) -> list[list[dict]]:
+def explain(req: ExplainRequest) -> list[list[dict]] | dict:
     """Return feature contributions for a model.
 
-    The endpoint returns a list for each input row, where each row
-    contains dictionaries mapping feature names to their SHAP
-    contributions. Returning a consistent list-of-lists structure avoids
-    FastAPI's response validation errors when multiple rows are
-    provided.
+    By default the endpoint returns a list for each input row, where each
+    row contains dictionaries mapping feature names to their SHAP
+    contributions. Batches larger than ``EXPLAIN_BATCH_ROWS`` are split
+    across a worker pool.
     """
     try:
-        import shap
+        import shap  # noqa: F401
     except Exception as exc:  # pragma: no cover - shap missing
         raise HTTPException(status_code=500, detail=str(exc))
     try:
@@ -513,32 +2596,43 @@ def explain(req: ExplainRequest) -> list[list[dict]]:
         raise HTTPException(status_code=400, detail=str(exc))
     if data.ndim == 1:
         data = data.reshape(1, -1)
-    model = _EXPLAIN_MODEL
-    feature_names = FEATURES
     if req.model:
-        try:
-            model_bytes = base64.b64decode(req.model.encode("ascii"))
-            model = pickle.loads(model_bytes)
-            feature_names = [f"f{i}" for i in range(data.shape[1])]
-        except Exception as exc:
-            raise HTTPException(status_code=400, detail=str(exc))
+        feature_names = [f"f{i}" for i in range(data.shape[1])]
+    else:
+        feature_names = FEATURES
     if data.shape[1] != len(feature_names):
         raise HTTPException(status_code=400, detail="Invalid feature count")
-    explainer = shap.TreeExplainer(model)
-    shap_values = explainer.shap_values(data)
-    if isinstance(shap_values, list):
-        shap_values = shap_values[1]
-    elif getattr(shap_values, "ndim", 0) == 3:
-        shap_values = shap_values[..., 1]
-    result = []
-    for row in shap_values:
-        result.append(
-            [
-                {"feature": f, "contribution": float(v)}
-                for f, v in zip(feature_names, row)
+    if len(data) > EXPLAIN_BATCH_ROWS and EXPLAIN_WORKERS > 1:
+        # resolve once here so unknown models fail before fanning out
+        get_explainer(req.model)
+        chunks = np.array_split(data, math.ceil(len(data) / EXPLAIN_BATCH_ROWS))
+        pool = get_explain_pool()
+        try:
+            futures = [
+                pool.submit(_explain_chunk, req.model, chunk, req.approximate)
+                for chunk in chunks
             ]
-        )
-    return result
+            shap_values = np.concatenate([f.result() for f in futures])
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        except BrokenProcessPool:
+            # a worker died (e.g. out of memory); start a fresh pool next time
+            get_explain_pool.discard(pool)
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise HTTPException(
+                status_code=503, detail="Explanation worker crashed, retry the request"
+            )
+    else:
+        shap_values = shap_contributions(req.model, data, req.approximate)
+    if req.layout == "columnar":
+        return {"features": list(feature_names), "values": shap_values}
+    return [
+        [
+            {"feature": f, "contribution": float(v)}
+            for f, v in zip(feature_names, row)
+        ]
+        for row in shap_values
+    ]
 
 
 @app.post("/confidence")
@@ -564,13 +2658,8 @@ def confidence_interval(series: Series) -> dict:
     upper = mean + h
     return {"mean": mean, "lower": float(lower), "upper": float(upper)}
 
-@app.post("/bias-report")
-def bias_report(req: TableData) -> dict:
-    """Return simple bias metrics for a sequence of numeric values."""
-    try:
-        values = np.asarray(req.data, dtype=float).flatten()
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
+def compute_bias_report(values: np.ndarray) -> dict:
+    """Score a flat array of values for anchoring, clutter and scale bias."""
     anchoring_score = detectAnchoring(values)
     clutter_score = estimateVisualClutter(values)
     scale_score = checkScaleBias(values)
@@ -590,11 +2679,196 @@ def bias_report(req: TableData) -> dict:
     }
 
 
+@app.post("/bias-report")
+def bias_report(req: TableData) -> dict:
+    """Return simple bias metrics for a sequence of numeric values."""
+    try:
+        values = np.asarray(req.data, dtype=float).flatten()
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return compute_bias_report(values)
+
+
+
+
+NN_INDEX_NEIGHBORS = int(os.environ.get("NN_INDEX_NEIGHBORS", 30))
+NN_DESCENT_MIN_SAMPLES = int(os.environ.get("NN_DESCENT_MIN_SAMPLES", 4096))
+NN_GRAPHS = ResultCache(
+    int(os.environ.get("NN_GRAPH_CACHE_BYTES", 256 * 1024 * 1024))
+)
+
+
+def nearest_neighbors(
+    data: np.ndarray, k: int, metric: str = "euclidean"
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(indices, distances)`` of the ``k`` nearest rows of each row.
+
+    Each row's own index is included (normally first, at distance 0). The
+    neighbour table is built once per matrix and metric with at least
+    ``NN_INDEX_NEIGHBORS`` columns and shared by every neighbour-based
+    endpoint; matrices with ``NN_DESCENT_MIN_SAMPLES`` rows or more use
+    pynndescent's approximate NN-descent instead of an exact search.
+    """
+    k = min(k, len(data))
+    key = result_cache_key("neighbors", data, {"metric": metric})
+    cached = NN_GRAPHS.get(key)
+    if cached is None or cached["indices"].shape[1] < k:
+        n_neighbors = min(max(k, NN_INDEX_NEIGHBORS), len(data))
+        try:
+            if len(data) < NN_DESCENT_MIN_SAMPLES:
+                from sklearn.neighbors import NearestNeighbors
+
+                index = NearestNeighbors(n_neighbors=n_neighbors, metric=metric)
+                distances, indices = index.fit(data).kneighbors(data)
+            else:
+                from pynndescent import NNDescent
+
+                index = NNDescent(data, n_neighbors=n_neighbors, metric=metric)
+                indices, distances = index.neighbor_graph
+        except (ValueError, TypeError) as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        cached = {"indices": indices, "distances": distances}
+        NN_GRAPHS.put(key, cached)
+    return cached["indices"][:, :k], cached["distances"][:, :k]
+
+
+def neighbor_graph(data: np.ndarray, k: int, metric: str = "euclidean") -> Any:
+    """Sparse ``k``-nearest-neighbour distance graph for ``metric="precomputed"``.
+
+    Self loops are stored as explicit zeros, which is what scikit-learn
+    expects when the graph is queried with the training rows.
+    """
+    from scipy.sparse import csr_matrix
+
+    indices, distances = nearest_neighbors(data, k, metric)
+    n, k = indices.shape
+    indptr = np.arange(0, n * k + 1, k)
+    # copies, so estimators may modify the graph without touching the cache
+    return csr_matrix((distances.flatten(), indices.flatten(), indptr), shape=(n, n))
+
+
+def radius_graph(data: np.ndarray, radius: float, metric: str = "euclidean") -> Any:
+    """Sparse graph of every pair of rows within ``radius``, with distances.
+
+    Unlike the k-nearest-neighbour table this keeps all neighbours inside the
+    radius, so estimators such as DBSCAN see exact neighbourhoods. It is
+    cached per matrix, metric and radius alongside the neighbour tables.
+    """
+    from scipy.sparse import csr_matrix
+
+    key = result_cache_key("radius", data, {"metric": metric, "radius": radius})
+    cached = NN_GRAPHS.get(key)
+    if cached is None:
+        from sklearn.neighbors import NearestNeighbors
+
+        try:
+            index = NearestNeighbors(radius=radius, metric=metric).fit(data)
+            graph = index.radius_neighbors_graph(data, mode="distance")
+        except (ValueError, TypeError) as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        cached = {
+            "data": graph.data,
+            "indices": graph.indices,
+            "indptr": graph.indptr,
+        }
+        NN_GRAPHS.put(key, cached)
+    n = len(data)
+    # copies, so estimators may modify the graph without touching the cache
+    return csr_matrix(
+        (cached["data"].copy(), cached["indices"].copy(), cached["indptr"].copy()),
+        shape=(n, n),
+    )
+
+
+def shared_graph_metric(params: dict, default: str = "euclidean") -> str | None:
+    """Metric for the shared neighbour graph, or ``None`` if it cannot be used.
+
+    Estimators configured with metric arguments the graph builder does not
+    know about keep computing their own neighbours.
+    """
+    if "p" in params or "metric_params" in params:
+        return None
+    metric = params.get("metric", default)
+    if not isinstance(metric, str) or metric == "precomputed":
+        return None
+    # scikit-learn's default minkowski metric has p=2
+    return "euclidean" if metric == "minkowski" else metric
+
+
+def _without(params: dict, *keys: str) -> dict:
+    return {k: v for k, v in params.items() if k not in keys}
+
+
+class NeighborEmbedding:
+    """Fitted t-SNE map that places new rows among their nearest neighbours.
+
+    scikit-learn's TSNE cannot embed unseen points, so ``transform`` puts
+    each row at the distance-weighted mean position of its nearest training
+    rows, the way openTSNE initialises points added to an existing map.
+    """
+
+    def __init__(self, data: np.ndarray, embedding: np.ndarray, n_neighbors: int = 10):
+        from sklearn.neighbors import NearestNeighbors
+
+        self.embedding = np.asarray(embedding, dtype=float)
+        self.n_features_in_ = data.shape[1]
+        self.index = NearestNeighbors(n_neighbors=min(n_neighbors, len(data))).fit(data)
+
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        distances, indices = self.index.kneighbors(data)
+        weights = 1.0 / np.maximum(distances, 1e-12)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.einsum("nk,nkd->nd", weights, self.embedding[indices])
+
+
+def _current_response(response: Response) -> Response:
+    return response
+
+
+# the injected response; ``None`` when an endpoint is called directly, e.g.
+# by a job or a flow node
+OptionalResponse = Annotated[Response | None, Depends(_current_response)]
+
+
+def persist_reducer(response: Response | None, reducer: Any) -> str:
+    """Register a fitted reducer and expose its id in ``X-Reducer-Id``."""
+    reducer_id = MODEL_STORE.put(reducer)
+    if response is not None:
+        response.headers["X-Reducer-Id"] = reducer_id
+    return reducer_id
+
+
+def apply_reducer(req: TransformRequest, reducer_type: type) -> np.ndarray:
+    """Embed ``req.data`` with a persisted reducer of the given type."""
+    reducer = MODEL_STORE.get(req.reducer)
+    if not isinstance(reducer, reducer_type):
+        raise HTTPException(
+            status_code=400, detail=f"{req.reducer} is not a {reducer_type.__name__} reducer"
+        )
+    try:
+        data = np.asarray(req.data, dtype=float)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    expected = getattr(reducer, "n_features_in_", None)
+    if data.ndim != 2 or (expected is not None and data.shape[1] != expected):
+        raise HTTPException(
+            status_code=400, detail=f"Expected rows with {expected} features"
+        )
+    try:
+        return np.asarray(reducer.transform(data), dtype=float)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
 
 @app.post("/tsne")
-def tsne(matrix: Matrix) -> list[list[float]]:
-    """Compute a t-SNE embedding for the given data."""
+def tsne(
+    matrix: Matrix, response: OptionalResponse = None, persist: bool = False
+) -> list[list[float]]:
+    """Compute a t-SNE embedding for the given data.
+
+    With ``persist=true`` the fitted map is stored for ``/tsne/transform``
+    and its id returned in the ``X-Reducer-Id`` header.
+    """
 
     from sklearn.manifold import TSNE
 
@@ -610,8 +2884,10 @@ def tsne(matrix: Matrix) -> list[list[float]]:
 
     n_samples = data.shape[0]
     if n_samples < 2:
+        if persist:
+            raise HTTPException(status_code=400, detail="Need at least 2 samples to persist")
         # t-SNE requires at least two samples; return a trivial embedding
-        return [[0.0, 0.0] for _ in range(n_samples)]
+        return np.zeros((n_samples, 2))
 
     # ensure perplexity is valid for the number of samples
     perplexity_raw = params.get("perplexity", 30)
@@ -622,13 +2898,56 @@ def tsne(matrix: Matrix) -> list[list[float]]:
     perplexity = max(1.0, min(perplexity, n_samples - 1))
     params["perplexity"] = perplexity
 
-    result = TSNE(n_components=2, **params).fit_transform(data)
-    return result.tolist()
+    if persist:
+        embedding = TSNE(n_components=2, **params).fit_transform(data)
+        persist_reducer(response, NeighborEmbedding(data, embedding))
+        return embedding
+
+    def compute() -> np.ndarray:
+        metric = shared_graph_metric(params)
+        if metric is None or params.get("method") == "exact":
+            return TSNE(n_components=2, **params).fit_transform(data)
+        kwargs = _without(params, "metric", "init")
+        init = params.get("init", "pca")
+        if isinstance(init, str) and init == "pca":
+            # TSNE refuses init="pca" for precomputed input; build it the same way
+            from sklearn.decomposition import PCA
+
+            init = PCA(
+                n_components=2,
+                svd_solver="randomized",
+                random_state=params.get("random_state"),
+            ).fit_transform(data)
+            init = init / np.std(init[:, 0]) * 1e-4
+        # TSNE looks at min(n - 1, 3 * perplexity + 1) neighbours besides itself
+        k = min(n_samples - 1, int(3.0 * perplexity + 1)) + 1
+        graph = neighbor_graph(data, k, metric)
+        if metric == "euclidean":
+            # TSNE works on squared euclidean distances
+            graph.data **= 2
+        return TSNE(
+            n_components=2, metric="precomputed", init=init, **kwargs
+        ).fit_transform(graph)
+
+    result = cached_compute("tsne", data, params, compute, matrix.cache)
+    return result
+
+
+@app.post("/tsne/transform")
+def tsne_transform(req: TransformRequest) -> list[list[float]]:
+    """Place new rows into a persisted t-SNE map without refitting."""
+    return apply_reducer(req, NeighborEmbedding)
 
 
 @app.post("/umap")
-def umap(matrix: Matrix) -> list[list[float]]:
-    """Compute a UMAP embedding for the given data."""
+def umap(
+    matrix: Matrix, response: OptionalResponse = None, persist: bool = False
+) -> list[list[float]]:
+    """Compute a UMAP embedding for the given data.
+
+    With ``persist=true`` the fitted model is stored for ``/umap/transform``
+    and its id returned in the ``X-Reducer-Id`` header.
+    """
 
     import umap
 
@@ -646,13 +2965,42 @@ def umap(matrix: Matrix) -> list[list[float]]:
         params["min_dist"] = max(0.0, min(1.0, float(params["min_dist"])))
 
     if n_samples < 3:
-        return [[0.0] * n_components for _ in range(n_samples)]
+        if persist:
+            raise HTTPException(status_code=400, detail="Need at least 3 samples to persist")
+        return np.zeros((n_samples, n_components))
 
     n_neighbors = int(params.get("n_neighbors", 15))
     n_neighbors = min(max(n_neighbors, 2), n_samples - 1)
     params["n_neighbors"] = n_neighbors
-    embedding = umap.UMAP(n_components=n_components, **params).fit_transform(data)
-    return embedding.tolist()
+    if persist:
+        reducer = umap.UMAP(n_components=n_components, **params)
+        embedding = reducer.fit_transform(data)
+        # UMAP does not record the input width that apply_reducer checks
+        reducer.n_features_in_ = data.shape[1]
+        persist_reducer(response, reducer)
+        return embedding
+
+    def compute() -> np.ndarray:
+        kwargs = dict(params)
+        metric = shared_graph_metric(params)
+        # below 4096 rows UMAP ignores precomputed neighbours and uses exact
+        # pairwise distances
+        if metric is not None and n_samples >= 4096:
+            kwargs["precomputed_knn"] = nearest_neighbors(data, n_neighbors, metric)
+        return umap.UMAP(n_components=n_components, **kwargs).fit_transform(data)
+
+    embedding = cached_compute(
+        "umap", data, {**params, "n_components": n_components}, compute, matrix.cache
+    )
+    return embedding
+
+
+@app.post("/umap/transform")
+def umap_transform(req: TransformRequest) -> list[list[float]]:
+    """Embed new rows with a persisted UMAP model without refitting."""
+    import umap
+
+    return apply_reducer(req, umap.UMAP)
 
 
 @app.post("/dbscan")
@@ -669,8 +3017,19 @@ def dbscan(matrix: Matrix) -> list[int]:
         return []
 
     params["min_samples"] = min(params.get("min_samples", 5), n_samples)
-    labels = DBSCAN(**params).fit_predict(data)
-    return labels.tolist()
+
+    def compute() -> np.ndarray:
+        metric = shared_graph_metric(params)
+        if metric is None:
+            return DBSCAN(**params).fit_predict(data)
+        graph = radius_graph(
+            np.asarray(data, dtype=float), float(params.get("eps", 0.5)), metric
+        )
+        kwargs = _without(params, "metric", "algorithm", "leaf_size")
+        return DBSCAN(metric="precomputed", **kwargs).fit_predict(graph)
+
+    labels = cached_compute("dbscan", data, params, compute, matrix.cache)
+    return labels
 
 
 @app.post("/spectral")
@@ -692,15 +3051,32 @@ def spectral(matrix: Matrix) -> list[int]:
     n_clusters = int(params.get("n_clusters", 8))
     n_clusters = min(max(n_clusters, 1), n_samples)
     params["n_clusters"] = n_clusters
-    labels = SpectralClustering(**params).fit_predict(data)
-    return labels.tolist()
+
+    def compute() -> np.ndarray:
+        if params.get("affinity") != "nearest_neighbors":
+            return SpectralClustering(**params).fit_predict(data)
+        graph = neighbor_graph(data, int(params.get("n_neighbors", 10)))
+        kwargs = _without(params, "affinity")
+        return SpectralClustering(
+            affinity="precomputed_nearest_neighbors", **kwargs
+        ).fit_predict(graph)
+
+    labels = cached_compute("spectral", data, params, compute, matrix.cache)
+    return labels
+
+
+KMEANS_MINIBATCH_ROWS = int(os.environ.get("KMEANS_MINIBATCH_ROWS", 100_000))
 
 
 @app.post("/kmeans")
 def kmeans(matrix: Matrix) -> dict:
-    """Cluster the given data using K-means."""
+    """Cluster the given data using K-means.
+
+    Matrices with ``KMEANS_MINIBATCH_ROWS`` rows or more are clustered with
+    MiniBatchKMeans; ``params.mini_batch`` forces either mode.
+    """
 
-    from sklearn.cluster import KMeans
+    from sklearn.cluster import KMeans, MiniBatchKMeans
 
     params = matrix.params or {}
     try:
@@ -715,11 +3091,19 @@ def kmeans(matrix: Matrix) -> dict:
     n_clusters = int(params.get("n_clusters", 8))
     n_clusters = min(max(n_clusters, 1), n_samples)
     params["n_clusters"] = n_clusters
-    kmeans = KMeans(**params).fit(data)
-    return {
-        "labels": kmeans.labels_.tolist(),
-        "centers": kmeans.cluster_centers_.tolist(),
-    }
+
+    mini_batch = params.get("mini_batch")
+    if mini_batch is None:
+        mini_batch = n_samples >= KMEANS_MINIBATCH_ROWS
+
+    def fit() -> dict:
+        kwargs = _without(params, "mini_batch")
+        estimator = MiniBatchKMeans if mini_batch else KMeans
+        model = estimator(**kwargs).fit(data)
+        return {"labels": model.labels_, "centers": model.cluster_centers_}
+
+    result = cached_compute("kmeans", data, params, fit, matrix.cache)
+    return result
 
 
 @app.post("/gmm")
@@ -741,30 +3125,240 @@ def gmm(matrix: Matrix) -> dict:
     n_components = int(params.get("n_components", 1))
     n_components = min(max(n_components, 1), n_samples)
     params["n_components"] = n_components
-    model = GaussianMixture(**params).fit(data)
-    labels = model.predict(data).tolist()
-    means = model.means_.tolist()
-    return {"labels": labels, "means": means}
 
+    def fit() -> dict:
+        model = GaussianMixture(**params).fit(data)
+        return {"labels": model.predict(data), "means": model.means_}
 
-@app.post("/isolation_forest")
-def isolation_forest(matrix: Matrix) -> list[int]:
-    """Detect outliers using the Isolation Forest algorithm."""
+    result = cached_compute("gmm", data, params, fit, matrix.cache)
+    return result
 
-    from sklearn.ensemble import IsolationForest
 
-    params = matrix.params or {}
-    try:
-        data = np.asarray(matrix.data, dtype=float)
-    except ValueError as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
+CLUSTER_SESSION_LIMIT = int(os.environ.get("CLUSTER_SESSION_LIMIT", 64))
+CLUSTER_SESSION_TTL = float(os.environ.get("CLUSTER_SESSION_TTL", 3600))
+# rows of every chunk a GMM session keeps (a uniform sample) to refit EM on
+CLUSTER_SESSION_RESERVOIR = int(os.environ.get("CLUSTER_SESSION_RESERVOIR", 20000))
 
-    if data.size == 0:
-        return []
 
-    model = IsolationForest(**params).fit(data)
-    labels = model.predict(data)
-    return labels.tolist()
+class ClusterSessionRequest(BaseModel):
+    params: dict | None = None
+
+
+class ClusterSession:
+    """An incrementally trained clustering model and its book-keeping."""
+
+    def __init__(self, kind: str, model: Any):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.model = model
+        self.samples = 0
+        self.reservoir: np.ndarray | None = None
+        self.lock = threading.Lock()
+
+    def _sample(self, data: np.ndarray) -> np.ndarray:
+        """Reservoir with ``data`` merged in, a uniform sample of all rows seen."""
+        kept = data[:0] if self.reservoir is None else self.reservoir
+        if data.shape[1] != kept.shape[1]:
+            raise ValueError(f"Expected {kept.shape[1]} features, got {data.shape[1]}")
+        room = max(CLUSTER_SESSION_RESERVOIR - len(kept), 0)
+        kept = np.concatenate([kept, data[:room]])
+        rest = data[room:]
+        if len(rest):
+            # the i-th row of the stream (1-based) takes a random slot with
+            # probability size/i
+            seen = self.samples + room
+            slots = np.random.default_rng().integers(
+                0, np.arange(seen + 1, seen + len(rest) + 1)
+            )
+            hit = slots < len(kept)
+            kept[slots[hit]] = rest[hit]
+        return kept
+
+    def partial_fit(self, data: np.ndarray) -> None:
+        if self.kind == "kmeans":
+            self.model.partial_fit(data)
+        else:
+            # EM on one chunk forgets the earlier ones, so refit the whole
+            # reservoir, warm-started from the current mixture
+            reservoir = self._sample(data)
+            self.model.fit(reservoir)
+            self.reservoir = reservoir
+        self.samples += len(data)
+
+    def describe(self) -> dict:
+        info: dict[str, Any] = {
+            "session": self.id,
+            "kind": self.kind,
+            "samples": self.samples,
+        }
+        if self.samples:
+            if self.kind == "kmeans":
+                info["centers"] = self.model.cluster_centers_
+            else:
+                info["means"] = self.model.means_
+                info["weights"] = self.model.weights_
+        return info
+
+
+class ClusterSessionStore:
+    """Clustering sessions kept in memory, LRU-bounded with an idle TTL."""
+
+    def __init__(self, max_sessions: int, ttl: float):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, tuple[float, ClusterSession]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session: ClusterSession) -> None:
+        with self._lock:
+            self._sessions[session.id] = (time.time(), session)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def get(self, kind: str, session_id: str) -> ClusterSession:
+        now = time.time()
+        with self._lock:
+            for sid in [
+                sid for sid, (seen, _) in self._sessions.items() if now - seen > self.ttl
+            ]:
+                del self._sessions[sid]
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._sessions[session_id] = (now, entry[1])
+        if entry is None or entry[1].kind != kind:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return entry[1]
+
+    def drop(self, kind: str, session_id: str) -> None:
+        self.get(kind, session_id)
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+CLUSTER_SESSIONS = ClusterSessionStore(CLUSTER_SESSION_LIMIT, CLUSTER_SESSION_TTL)
+
+
+class _ClusterKindConvertor(Convertor):
+    # keeps the session routes from capturing other ``/<name>/sessions`` paths
+    regex = "kmeans|gmm"
+
+    def convert(self, value: str) -> str:
+        return value
+
+    def to_string(self, value: str) -> str:
+        return value
+
+
+register_url_convertor("cluster_kind", _ClusterKindConvertor())
+
+
+def _session_matrix(req: MatrixSource) -> np.ndarray:
+    try:
+        data = np.asarray(req.data, dtype=float)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if data.ndim != 2 or len(data) == 0:
+        raise HTTPException(status_code=400, detail="Expected a non-empty 2-D matrix")
+    return data
+
+
+@app.post("/{kind:cluster_kind}/sessions", status_code=201)
+def create_cluster_session(
+    kind: Literal["kmeans", "gmm"], req: ClusterSessionRequest
+) -> dict:
+    """Start an incremental clustering session.
+
+    ``kmeans`` sessions use MiniBatchKMeans. ``gmm`` sessions refit a
+    warm-started GaussianMixture, or BayesianGaussianMixture with
+    ``params.bayesian``, on a reservoir sample of all chunks. Remaining
+    params go to the estimator.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.mixture import BayesianGaussianMixture, GaussianMixture
+
+    params = dict(req.params or {})
+    try:
+        if kind == "kmeans":
+            model = MiniBatchKMeans(**params)
+        else:
+            estimator = BayesianGaussianMixture if params.pop("bayesian", False) else GaussianMixture
+            model = estimator(warm_start=True, **params)
+    except TypeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    session = ClusterSession(kind, model)
+    CLUSTER_SESSIONS.add(session)
+    return session.describe()
+
+
+@app.get("/{kind:cluster_kind}/sessions/{session_id}")
+def describe_cluster_session(kind: Literal["kmeans", "gmm"], session_id: str) -> dict:
+    """Return the number of samples seen and the current cluster centres."""
+    session = CLUSTER_SESSIONS.get(kind, session_id)
+    with session.lock:
+        return session.describe()
+
+
+@app.post("/{kind:cluster_kind}/sessions/{session_id}/partial_fit")
+def partial_fit_cluster_session(
+    kind: Literal["kmeans", "gmm"], session_id: str, req: MatrixSource
+) -> dict:
+    """Update a session's model with another chunk of rows."""
+    session = CLUSTER_SESSIONS.get(kind, session_id)
+    data = _session_matrix(req)
+    with session.lock:
+        try:
+            session.partial_fit(data)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return session.describe()
+
+
+@app.post("/{kind:cluster_kind}/sessions/{session_id}/predict")
+def predict_cluster_session(
+    kind: Literal["kmeans", "gmm"], session_id: str, req: MatrixSource
+) -> list[int]:
+    """Assign rows to the session's current clusters."""
+    session = CLUSTER_SESSIONS.get(kind, session_id)
+    data = _session_matrix(req)
+    with session.lock:
+        if not session.samples:
+            raise HTTPException(status_code=409, detail="Session has not been fitted")
+        try:
+            return session.model.predict(data)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.delete("/{kind:cluster_kind}/sessions/{session_id}")
+def delete_cluster_session(kind: Literal["kmeans", "gmm"], session_id: str) -> dict:
+    """Discard a clustering session."""
+    CLUSTER_SESSIONS.drop(kind, session_id)
+    return {"status": "ok"}
+
+
+@app.post("/isolation_forest")
+def isolation_forest(matrix: Matrix) -> list[int]:
+    """Detect outliers using the Isolation Forest algorithm."""
+
+    from sklearn.ensemble import IsolationForest
+
+    params = matrix.params or {}
+    try:
+        data = np.asarray(matrix.data, dtype=float)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if data.size == 0:
+        return []
+
+    labels = cached_compute(
+        "isolation_forest",
+        data,
+        params,
+        lambda: IsolationForest(**params).fit(data).predict(data),
+        matrix.cache,
+    )
+    return labels
 
 
 @app.post("/lof")
@@ -786,14 +3380,28 @@ def local_outlier_factor(matrix: Matrix) -> list[int]:
     n_neighbors = int(params.get("n_neighbors", 20))
     n_neighbors = min(max(n_neighbors, 1), n_samples - 1) if n_samples > 1 else 1
     params["n_neighbors"] = n_neighbors
-    model = LocalOutlierFactor(**params)
-    labels = model.fit_predict(data)
-    return labels.tolist()
+
+    def compute() -> np.ndarray:
+        metric = shared_graph_metric(params, default="minkowski")
+        if metric is None or n_samples < 2:
+            return LocalOutlierFactor(**params).fit_predict(data)
+        graph = neighbor_graph(data, n_neighbors + 1, metric)
+        kwargs = _without(params, "metric", "algorithm", "leaf_size")
+        return LocalOutlierFactor(metric="precomputed", **kwargs).fit_predict(graph)
+
+    labels = cached_compute("lof", data, params, compute, matrix.cache)
+    return labels
 
 
 @app.post("/pca")
-def pca(matrix: Matrix) -> list[list[float]]:
-    """Compute a PCA embedding for the given data."""
+def pca(
+    matrix: Matrix, response: OptionalResponse = None, persist: bool = False
+) -> list[list[float]]:
+    """Compute a PCA embedding for the given data.
+
+    With ``persist=true`` the fitted model is stored for ``/pca/transform``
+    and its id returned in the ``X-Reducer-Id`` header.
+    """
 
     from sklearn.decomposition import PCA
 
@@ -809,8 +3417,23 @@ def pca(matrix: Matrix) -> list[list[float]]:
     n_components = int(params.get("n_components", 2))
     n_components = min(max(n_components, 1), data.shape[1])
     params["n_components"] = n_components
-    embedding = PCA(**params).fit_transform(data)
-    return embedding.tolist()
+    if persist:
+        reducer = PCA(**params)
+        embedding = reducer.fit_transform(data)
+        persist_reducer(response, reducer)
+        return embedding
+    embedding = cached_compute(
+        "pca", data, params, lambda: PCA(**params).fit_transform(data), matrix.cache
+    )
+    return embedding
+
+
+@app.post("/pca/transform")
+def pca_transform(req: TransformRequest) -> list[list[float]]:
+    """Project new rows with a persisted PCA model."""
+    from sklearn.decomposition import PCA
+
+    return apply_reducer(req, PCA)
 
 
 @app.post("/hyperdr")
@@ -826,14 +3449,20 @@ def hyperdr(matrix: Matrix) -> list[list[float]]:
     method = params.get("method", "autoencoder")
     if method == "autoencoder":
         latent = int(params.get("latent_dim", 2))
-        result = autoencoderProjection(data, latent)
+
+        def compute() -> np.ndarray:
+            return autoencoderProjection(data, latent)
+
     elif method == "som":
         grid = int(params.get("grid_size", 10))
-        result = np.asarray(somProjection(data, grid), dtype=float)
+
+        def compute() -> np.ndarray:
+            return np.asarray(somProjection(data, grid), dtype=float)
+
     else:
         raise HTTPException(status_code=400, detail="Unknown method")
 
-    return result.tolist()
+    return cached_compute("hyperdr", data, params, compute, matrix.cache)
 
 
 @app.post("/persistence")
@@ -852,8 +3481,13 @@ def persistence_diagram(matrix: Matrix) -> list[list[list[float | None]]]:
         return []
 
     maxdim = int(params.get("maxdim", 1))
-    result = ripser(data, maxdim=maxdim)
-    dgms = result.get("dgms", [])
+    dgms = cached_compute(
+        "persistence",
+        data,
+        {"maxdim": maxdim},
+        lambda: ripser(data, maxdim=maxdim).get("dgms", []),
+        matrix.cache,
+    )
     cleaned: list[list[list[float | None]]] = []
     for dgm in dgms:
         cleaned.append(
@@ -865,11 +3499,47 @@ def persistence_diagram(matrix: Matrix) -> list[list[list[float | None]]]:
     return cleaned
 
 
+def rips_edges(data: np.ndarray, epsilon: float) -> np.ndarray:
+    """Return the ``(i, j)`` pairs with ``i < j`` and distance <= ``epsilon``.
+
+    Pairs come from KD-tree radius queries, so memory scales with the number
+    of edges rather than with n². Edges are int32 and sorted lexicographically.
+    """
+    from scipy.spatial import cKDTree
+
+    if data.shape[0] < 2 or epsilon < 0:
+        return np.empty((0, 2), dtype=np.int32)
+    pairs = cKDTree(data).query_pairs(epsilon, output_type="ndarray")
+    pairs = pairs.astype(np.int32, copy=False)
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+def rips_filtration(data: np.ndarray, epsilons: list[float]) -> dict:
+    """Return the edge filtration of the Rips complex up to ``max(epsilons)``.
+
+    Edges are sorted by length; ``counts[k]`` is the number of edges present
+    at ``epsilons[k]``, so the complex at that scale is ``edges[:counts[k]]``.
+    """
+    eps = np.asarray(epsilons, dtype=float)
+    edges = rips_edges(data, float(eps.max()))
+    lengths = np.linalg.norm(data[edges[:, 0]] - data[edges[:, 1]], axis=1)
+    order = np.argsort(lengths, kind="stable")
+    edges, lengths = edges[order], lengths[order]
+    return {
+        "edges": edges,
+        "lengths": lengths,
+        "epsilons": eps,
+        "counts": np.searchsorted(lengths, eps, side="right"),
+    }
+
+
 @app.post("/vietoris_rips")
-def vietoris_rips(matrix: Matrix) -> list[list[int]]:
-    """Return edges of the Vietoris–Rips complex for epsilon."""
+def vietoris_rips(matrix: Matrix) -> list[list[int]] | dict:
+    """Return edges of the Vietoris–Rips complex for epsilon.
 
-    from sklearn.metrics import pairwise_distances
+    Passing a list of ``epsilons`` instead returns the whole edge filtration
+    (see :func:`rips_filtration`) in a single response.
+    """
 
     params = matrix.params or {}
     try:
@@ -880,68 +3550,773 @@ def vietoris_rips(matrix: Matrix) -> list[list[int]]:
     if data.ndim != 2:
         raise HTTPException(status_code=400, detail="Input must be a 2D array")
 
-    n_samples = data.shape[0]
-    if n_samples == 0:
+    epsilons = params.get("epsilons")
+    if epsilons is not None:
+        try:
+            epsilons = [float(e) for e in epsilons]
+        except (TypeError, ValueError) as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid epsilons: {exc}")
+        if not epsilons:
+            raise HTTPException(status_code=400, detail="epsilons must not be empty")
+        return cached_compute(
+            "vietoris_rips",
+            data,
+            {"epsilons": epsilons},
+            lambda: rips_filtration(data, epsilons),
+            matrix.cache,
+        )
+
+    if data.shape[0] == 0:
         return []
 
     epsilon = float(params.get("epsilon", 1.0))
-    dists = pairwise_distances(data)
-    edges: list[list[int]] = []
-    for i in range(n_samples):
-        for j in range(i + 1, n_samples):
-            if dists[i, j] <= epsilon:
-                edges.append([i, j])
-    return edges
+    return cached_compute(
+        "vietoris_rips",
+        data,
+        {"epsilon": epsilon},
+        lambda: rips_edges(data, epsilon),
+        matrix.cache,
+    )
+
+
+JOB_ENDPOINTS: dict[str, Callable[[Matrix], Any]] = {
+    "tsne": tsne,
+    "umap": umap,
+    "spectral": spectral,
+    "hyperdr": hyperdr,
+    "persistence": persistence_diagram,
+    "dbscan": dbscan,
+    "kmeans": kmeans,
+    "gmm": gmm,
+    "isolation_forest": isolation_forest,
+    "lof": local_outlier_factor,
+    "pca": pca,
+}
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", min(4, os.cpu_count() or 1)))
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", 64))
+JOB_RESULT_TTL = float(os.environ.get("JOB_RESULT_TTL", 600))
+
+
+def _run_job(endpoint: str, matrix: Matrix) -> Any:
+    """Execute an analytics endpoint inside a pool worker."""
+    try:
+        return JOB_ENDPOINTS[endpoint](matrix)
+    except HTTPException as exc:
+        # HTTPException does not survive pickling back to the parent process
+        raise ValueError(exc.detail) from None
+
+
+class Job:
+    """Book-keeping for a computation submitted to the job pool."""
+
+    def __init__(self, endpoint: str, future: Future):
+        self.id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.future = future
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.cancelled = False
+        future.add_done_callback(self._finish)
+
+    def _finish(self, _: Future) -> None:
+        self.finished_at = time.time()
+
+    @property
+    def status(self) -> str:
+        if self.cancelled or self.future.cancelled():
+            return "cancelled"
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        return "failed" if self.future.exception() is not None else "done"
+
+    def describe(self) -> dict:
+        status = self.status
+        info: dict[str, Any] = {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "status": status,
+            "progress": 1.0 if self.finished_at is not None else 0.0,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if status == "failed":
+            info["error"] = str(self.future.exception())
+        return info
+
+
+class JobManager:
+    """Run long computations in a bounded process pool.
+
+    The pool is created on first use. Finished jobs are kept for
+    ``JOB_RESULT_TTL`` seconds and then dropped. Queued jobs can be cancelled
+    outright; a job that is already running cannot be interrupted without
+    tearing down the pool, so it is flagged as cancelled and its result is
+    discarded when it completes.
+    """
+
+    def __init__(self, max_workers: int, queue_limit: int, ttl: float):
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self.ttl = ttl
+        self._executor: ProcessPoolExecutor | None = None
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def _purge(self) -> None:
+        now = time.time()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, endpoint: str, matrix: Matrix) -> Job:
+        with self._lock:
+            self._purge()
+            active = sum(1 for job in self._jobs.values() if not job.future.done())
+            if active >= self.queue_limit:
+                raise HTTPException(status_code=429, detail="Job queue is full")
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=_process_context()
+                )
+            job = Job(endpoint, self._executor.submit(_run_job, endpoint, matrix))
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    def shutdown(self) -> None:
+        """Stop the pool, cancelling queued jobs and waiting for running ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def cancel(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        if not job.future.cancel() and not job.future.done():
+            job.cancelled = True
+        if job.finished_at is None and job.future.cancelled():
+            job.finished_at = time.time()
+        return job
+
+
+JOBS = JobManager(JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_RESULT_TTL)
+
+
+@app.post("/jobs/{endpoint}", status_code=202)
+def submit_job(endpoint: str, matrix: Matrix) -> dict:
+    """Queue an analytics computation and return its job id immediately."""
+    if endpoint not in JOB_ENDPOINTS:
+        raise HTTPException(status_code=404, detail=f"Unknown job endpoint {endpoint}")
+    return JOBS.submit(endpoint, matrix).describe()
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str) -> dict:
+    """Return status and, once finished, the result of a job."""
+    job = JOBS.get(job_id)
+    info = job.describe()
+    if info["status"] == "done":
+        info["result"] = job.future.result()
+    return info
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str) -> Any:
+    """Return only the result of a finished job, honouring the Accept header."""
+    job = JOBS.get(job_id)
+    status = job.status
+    if status == "failed":
+        raise HTTPException(status_code=500, detail=str(job.future.exception()))
+    if status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {status}")
+    return job.future.result()
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str) -> dict:
+    """Cancel a queued job or discard the result of a running one."""
+    return JOBS.cancel(job_id).describe()
+
+
+IMSHOW_SIZE = int(os.environ.get("IMSHOW_SIZE", 512))
+IMSHOW_PNG_LEVEL = int(os.environ.get("IMSHOW_PNG_LEVEL", 1))
+
+
+@functools.lru_cache(maxsize=64)
+def colormap_lut(name: str, n: int = 256) -> np.ndarray:
+    """Return an ``n``-entry RGBA ``uint8`` lookup table of a Matplotlib colormap."""
+    import matplotlib
+
+    try:
+        cmap = matplotlib.colormaps[name]
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown colormap {name}")
+    return cmap(np.linspace(0.0, 1.0, n), bytes=True)
+
+
+def _resample_taps(n_in: int, n_out: int, interpolation: str) -> tuple[np.ndarray, np.ndarray]:
+    """Source indices and weights, each ``(taps, n_out)``, for one axis."""
+    if interpolation in ("nearest", "none"):
+        idx = (np.arange(n_out) * n_in) // n_out
+        return idx[None], np.ones((1, n_out))
+    centers = (np.arange(n_out) + 0.5) * n_in / n_out - 0.5
+    base = np.floor(centers)
+    t = centers - base
+    if interpolation == "bilinear":
+        offsets = [0, 1]
+        weights = [1 - t, t]
+    elif interpolation == "bicubic":
+        # Keys cubic convolution kernel with a = -0.5
+        offsets = [-1, 0, 1, 2]
+        weights = [
+            ((-0.5 * t + 1.0) * t - 0.5) * t,
+            (1.5 * t - 2.5) * t * t + 1.0,
+            ((-1.5 * t + 2.0) * t + 0.5) * t,
+            (0.5 * t - 0.5) * t * t,
+        ]
+    else:
+        raise HTTPException(
+            status_code=400, detail=f"Unsupported interpolation {interpolation}"
+        )
+    idx = np.clip(base[None] + np.array(offsets)[:, None], 0, n_in - 1)
+    return idx.astype(np.intp), np.stack(weights)
+
+
+def resample(data: np.ndarray, shape: tuple[int, int], interpolation: str) -> np.ndarray:
+    """Resize a 2-D array to ``shape`` one axis at a time."""
+    for axis, n_out in enumerate(shape):
+        n_in = data.shape[axis]
+        if n_in == n_out:
+            continue
+        idx, weights = _resample_taps(n_in, n_out, interpolation)
+        if len(idx) == 1:
+            data = np.take(data, idx[0], axis=axis)
+            continue
+        out = None
+        for taps, w in zip(idx, weights):
+            term = np.take(data, taps, axis=axis) * (w[:, None] if axis == 0 else w)
+            out = term if out is None else out + term
+        data = out
+    return data
+
+
+def encode_png(indices: np.ndarray, palette: np.ndarray, level: int = IMSHOW_PNG_LEVEL) -> bytes:
+    """Encode an ``(h, w)`` array of palette indices as an indexed-colour PNG.
+
+    ``palette`` holds up to 256 RGBA ``uint8`` entries; a tRNS chunk is
+    emitted when any of them is not opaque. One byte per pixel keeps zlib
+    input a third of the size of an RGB image.
+    """
+    height, width = indices.shape
+    rows = np.zeros((height, width + 1), dtype=np.uint8)
+    rows[:, 1:] = indices
+
+    def chunk(tag: bytes, body: bytes) -> bytes:
+        crc = zlib.crc32(tag + body)
+        return struct.pack(">I", len(body)) + tag + body + struct.pack(">I", crc)
+
+    parts = [
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)),
+        chunk(b"PLTE", palette[:, :3].tobytes()),
+    ]
+    if (palette[:, 3] < 255).any():
+        parts.append(chunk(b"tRNS", palette[:, 3].tobytes()))
+    parts.append(chunk(b"IDAT", zlib.compress(rows.tobytes(), level)))
+    parts.append(chunk(b"IEND", b""))
+    return b"".join(parts)
+
+
+def render_png(
+    data: Any,
+    cmap: str = "viridis",
+    interpolation: str = "nearest",
+    vmin: float | None = None,
+    vmax: float | None = None,
+    size: int | None = None,
+) -> bytes:
+    """Render a matrix as a colormapped PNG without creating a figure.
+
+    The longer side of the image is ``size`` pixels; non-finite values are
+    drawn transparent.
+    """
+    try:
+        data = np.asarray(data, dtype=float)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if data.ndim != 2 or data.size == 0:
+        raise HTTPException(status_code=400, detail="Expected a non-empty 2-D matrix")
+    colormap_lut(cmap)  # reject unknown colormaps before doing any work
+    if vmin is None or vmax is None:
+        lo, hi = data.min(), data.max()
+        if not (np.isfinite(lo) and np.isfinite(hi)):
+            values = data[np.isfinite(data)]
+            lo, hi = (values.min(), values.max()) if values.size else (0.0, 0.0)
+        vmin = lo if vmin is None else vmin
+        vmax = hi if vmax is None else vmax
+
+    scale = (size or IMSHOW_SIZE) / max(data.shape)
+    shape = tuple(max(1, round(n * scale)) for n in data.shape)
+    data = resample(data, shape, interpolation)
+
+    finite = np.isfinite(data)
+    # without missing values all 256 palette slots hold colours, otherwise
+    # the last one is reserved for transparent pixels
+    colours = 256 if finite.all() else 255
+    levels = (data - vmin) * (colours / (vmax - vmin) if vmax > vmin else 0.0)
+    np.clip(levels, 0, colours - 1, out=levels)
+    palette = colormap_lut(cmap, colours)
+    if colours < 256:
+        levels[~finite] = 255
+        palette = np.vstack([palette, np.zeros((1, 4), dtype=np.uint8)])
+    return encode_png(levels.astype(np.uint8), palette)
+
+
+def render_imshow(
+    data: Any,
+    cmap: str = "viridis",
+    interpolation: str = "nearest",
+    vmin: float | None = None,
+    vmax: float | None = None,
+    size: int | None = None,
+) -> str:
+    """Render an array as a PNG data URL."""
+    png = render_png(data, cmap, interpolation, vmin, vmax, size)
+    return "data:image/png;base64," + base64.b64encode(png).decode("ascii")
 
 
 @app.post("/imshow")
-def imshow(req: ImshowRequest) -> str:
-    """Render an array as an image using Matplotlib."""
+def imshow(req: ImshowRequest, accept: str | None = Header(None)) -> str:
+    """Render an array as a heatmap image.
 
-    import base64
-    import io
-    import matplotlib.pyplot as plt
+    Returns a PNG data URL, or raw ``image/png`` bytes when requested via
+    ``format`` or the ``Accept`` header.
+    """
+    args = (req.data, req.cmap, req.interpolation, req.vmin, req.vmax, req.size)
+    if req.format == "png" or "image/png" in (accept or ""):
+        return Response(render_png(*args), media_type="image/png")
+    return render_imshow(*args)
 
+
+IMSHOW_PYRAMIDS = ResultCache(
+    int(os.environ.get("IMSHOW_PYRAMID_CACHE_BYTES", 1024 * 1024 * 1024))
+)
+IMSHOW_TILES = ResultCache(
+    int(os.environ.get("IMSHOW_TILE_CACHE_BYTES", 64 * 1024 * 1024))
+)
+
+
+def _halve(level: np.ndarray, stat: str) -> np.ndarray:
+    """Downsample a level by 2 in each direction, ignoring missing values."""
+    height, width = level.shape
+    padded = np.full((height + height % 2, width + width % 2), np.nan, dtype=level.dtype)
+    padded[:height, :width] = level
+    quads = [padded[0::2, 0::2], padded[1::2, 0::2], padded[0::2, 1::2], padded[1::2, 1::2]]
+    if stat == "min":
+        return functools.reduce(np.fmin, quads)
+    if stat == "max":
+        return functools.reduce(np.fmax, quads)
+    finite = [np.isfinite(q) for q in quads]
+    total = sum(np.where(f, q, 0) for q, f in zip(quads, finite))
+    count = sum(f.astype(level.dtype) for f in finite)
+    with np.errstate(invalid="ignore"):
+        return total / count
+
+
+def build_pyramid(data: np.ndarray, tile_size: int) -> dict:
+    """Build min/mean/max levels, coarsest first, down to full resolution.
+
+    Level ``z`` is ``2**(depth - 1 - z)`` times smaller than the matrix;
+    level 0 fits into a single tile.
+    """
+    full = np.asarray(data, dtype=np.float32)
+    levels = [{"min": full, "mean": full, "max": full}]
+    while max(levels[-1]["mean"].shape) > tile_size:
+        levels.append({stat: _halve(arr, stat) for stat, arr in levels[-1].items()})
+    levels.reverse()
+    finite = full[np.isfinite(full)]
+    return {
+        "levels": levels,
+        "shape": list(full.shape),
+        "tile_size": tile_size,
+        "vmin": float(finite.min()) if finite.size else 0.0,
+        "vmax": float(finite.max()) if finite.size else 0.0,
+    }
+
+
+def _describe_pyramid(pyramid_id: str, pyramid: dict) -> dict:
+    return {
+        "id": pyramid_id,
+        "shape": pyramid["shape"],
+        "tile_size": pyramid["tile_size"],
+        "levels": [list(level["mean"].shape) for level in pyramid["levels"]],
+        "vmin": pyramid["vmin"],
+        "vmax": pyramid["vmax"],
+    }
+
+
+def _get_pyramid(pyramid_id: str) -> dict:
+    pyramid = IMSHOW_PYRAMIDS.get(pyramid_id)
+    if pyramid is None:
+        raise HTTPException(status_code=404, detail="Pyramid not found")
+    return pyramid
+
+
+@app.post("/imshow/pyramids")
+def create_pyramid(req: PyramidRequest) -> dict:
+    """Build (or reuse) the tile pyramid of a matrix and describe it.
+
+    The id is derived from the matrix contents, so posting the same matrix
+    again returns the existing pyramid without rebuilding it.
+    """
     try:
         data = np.asarray(req.data, dtype=float)
     except (ValueError, TypeError) as exc:
         raise HTTPException(status_code=400, detail=str(exc))
-
-    fig, ax = plt.subplots()
-    ax.imshow(
-        data,
-        cmap=req.cmap,
-        interpolation=req.interpolation,
-        vmin=req.vmin,
-        vmax=req.vmax,
+    if data.ndim != 2 or data.size == 0:
+        raise HTTPException(status_code=400, detail="Expected a non-empty 2-D matrix")
+    pyramid_id = result_cache_key("imshow_pyramid", data, {"tile_size": req.tile_size})
+    pyramid = IMSHOW_PYRAMIDS.get(pyramid_id)
+    if pyramid is None:
+        pyramid = build_pyramid(data, req.tile_size)
+        arrays = {id(a): a for level in pyramid["levels"] for a in level.values()}
+        IMSHOW_PYRAMIDS.put(
+            pyramid_id, pyramid, sum(a.nbytes for a in arrays.values())
+        )
+    return _describe_pyramid(pyramid_id, pyramid)
+
+
+@app.get("/imshow/{pyramid_id}")
+def describe_pyramid(pyramid_id: str) -> dict:
+    """Return the shape, tile size and level sizes of a pyramid."""
+    return _describe_pyramid(pyramid_id, _get_pyramid(pyramid_id))
+
+
+@app.get("/imshow/{pyramid_id}/tile/{z}/{x}/{y}")
+def pyramid_tile(
+    pyramid_id: str,
+    z: int,
+    x: int,
+    y: int,
+    stat: Literal["min", "mean", "max"] = "mean",
+    cmap: str = "viridis",
+    vmin: float | None = None,
+    vmax: float | None = None,
+) -> Response:
+    """Render one tile of a pyramid level as a PNG.
+
+    Colours are scaled to the whole matrix unless ``vmin``/``vmax`` are
+    given, so neighbouring tiles match. Tiles past the matrix edge are
+    padded with transparent pixels.
+    """
+    key = f"{pyramid_id}/{z}/{x}/{y}/{stat}/{cmap}/{vmin}/{vmax}"
+    png = IMSHOW_TILES.get(key)
+    if png is None:
+        pyramid = _get_pyramid(pyramid_id)
+        size = pyramid["tile_size"]
+        if not 0 <= z < len(pyramid["levels"]) or x < 0 or y < 0:
+            raise HTTPException(status_code=404, detail="Tile not found")
+        level = pyramid["levels"][z][stat]
+        tile = level[y * size : (y + 1) * size, x * size : (x + 1) * size]
+        if tile.size == 0:
+            raise HTTPException(status_code=404, detail="Tile not found")
+        if tile.shape != (size, size):
+            tile = np.pad(
+                tile,
+                ((0, size - tile.shape[0]), (0, size - tile.shape[1])),
+                constant_values=np.nan,
+            )
+        png = render_png(
+            tile,
+            cmap,
+            "nearest",
+            pyramid["vmin"] if vmin is None else vmin,
+            pyramid["vmax"] if vmax is None else vmax,
+            size,
+        )
+        IMSHOW_TILES.put(key, png, len(png))
+    # pyramid ids are content hashes, so a tile never changes
+    return Response(
+        png, media_type="image/png", headers={"Cache-Control": "max-age=86400"}
     )
-    ax.axis("off")
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png", bbox_inches="tight", pad_inches=0)
-    plt.close(fig)
-    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
 
 
-@app.post("/python")
-def run_python(req: CodeRequest) -> Any:
-    """Execute arbitrary Python code with optional data."""
+def execute_python(code: str, data: Any, namespace: dict | None = None) -> Any:
+    """Evaluate ``code`` as an expression or run it as statements.
 
+    Statements may assign a variable named ``result`` which is returned.
+    ``namespace`` keeps variables between calls; ``data`` is only replaced
+    in it when not None.
+    """
     # share a single namespace for executed code so that functions defined
     # within the provided snippet can access variables defined alongside
     # them. Using separate globals and locals (as done previously) causes
     # lookups for these variables to fail when the function is executed.
-    namespace = {"data": req.data}
+    if namespace is None:
+        namespace = {}
+    if data is not None or "data" not in namespace:
+        namespace["data"] = data
+    namespace.pop("result", None)
     try:
         # try to evaluate the code as an expression first
-        result = eval(req.code, namespace)
+        return eval(code, namespace)
     except Exception:
         # fall back to executing statements; any variable named ``result``
         # will be returned to the caller
-        exec(req.code, namespace)
-        result = namespace.get("result")
-    # ensure the result is JSON serialisable
-    if callable(result):
-        return repr(result)
+        exec(code, namespace)
+        return namespace.get("result")
+
+
+PYTHON_WORKERS = int(os.environ.get("PYTHON_WORKERS", 2))
+PYTHON_TIMEOUT = float(os.environ.get("PYTHON_TIMEOUT", 60))
+PYTHON_CPU_SECONDS = int(os.environ.get("PYTHON_CPU_SECONDS", 30))
+PYTHON_MEMORY_MB = int(os.environ.get("PYTHON_MEMORY_MB", 4096))
+PYTHON_SESSION_TTL = float(os.environ.get("PYTHON_SESSION_TTL", 3600))
+
+
+def _python_worker(conn: Any, cpu_seconds: int, memory_mb: int) -> None:
+    """Serve ``/python`` calls sent over ``conn`` until the pipe closes.
+
+    Runs in a worker process with numpy and pandas preloaded. The address
+    space is capped at ``memory_mb`` (a snippet exceeding it gets a
+    MemoryError) and every call may use ``cpu_seconds`` of CPU time.
+    Named sessions keep their namespace in this process between calls.
+    """
+    import signal
+
+    _pandas()  # imported once so snippets start warm
+
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - not available on Windows
+        resource = None
+
+    def cpu_exceeded(signum: int, frame: Any) -> None:
+        raise RuntimeError(f"CPU time limit of {cpu_seconds} s exceeded")
+
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, cpu_exceeded)
+        if memory_mb > 0:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    sessions: dict[str, dict] = {}
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        for name in request.get("drop", ()):
+            sessions.pop(name, None)
+        if request.get("code") is None:
+            conn.send(("ok", None))
+            continue
+        session = request.get("session")
+        namespace = sessions.setdefault(session, {}) if session else {}
+        if resource is not None and cpu_seconds > 0:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = math.ceil(usage.ru_utime + usage.ru_stime)
+            resource.setrlimit(
+                resource.RLIMIT_CPU, (used + cpu_seconds, resource.RLIM_INFINITY)
+            )
+        try:
+            result = execute_python(request["code"], request["data"], namespace)
+            if callable(result):
+                result = repr(result)
+            reply = ("ok", result)
+        except BaseException as exc:
+            reply = ("error", f"{type(exc).__name__}: {exc}")
+        try:
+            conn.send(reply)
+        except Exception as exc:  # unpicklable result
+            conn.send(("error", f"Unable to serialize result: {exc}"))
+
+
+class PythonWorker:
+    """One worker process and the pipe used to talk to it."""
+
+    def __init__(self, context: Any):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_python_worker,
+            args=(child, PYTHON_CPU_SECONDS, PYTHON_MEMORY_MB),
+            name="python-worker",
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+        self.busy = False
+        # session name -> last use, and sessions deleted since the last call
+        self.sessions: dict[str, float] = {}
+        self.dropped: list[str] = []
+
+    def call(self, request: dict, timeout: float) -> tuple[str, Any]:
+        self.conn.send(request)
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class PythonWorkerPool:
+    """Pre-started processes that run ``/python`` snippets in isolation.
+
+    Each worker runs one call at a time. Calls naming a ``session`` always
+    go to the worker holding that session's namespace; other calls take any
+    idle worker. A call that exceeds ``timeout`` seconds of wall time, or
+    whose worker dies (for example by running out of memory), kills and
+    replaces only that worker, losing the sessions it held; a later call
+    that fails in a lost session is answered with 410.
+    """
+
+    def __init__(self, size: int, timeout: float, session_ttl: float):
+        self._context = _process_context()
+        self.timeout = timeout
+        self.session_ttl = session_ttl
+        self._cond = threading.Condition()
+        self._workers = [PythonWorker(self._context) for _ in range(max(size, 1))]
+        # sessions held by restarted workers -> time they were lost
+        self._lost: dict[str, float] = {}
+
+    def _acquire(self, session: str | None) -> PythonWorker:
+        with self._cond:
+            if session is not None:
+                # resolved again after every wait: the worker may have been
+                # replaced in the meantime
+                while True:
+                    worker = next(
+                        (w for w in self._workers if session in w.sessions), None
+                    ) or min(self._workers, key=lambda w: len(w.sessions))
+                    if not worker.busy:
+                        break
+                    self._cond.wait()
+                worker.sessions[session] = time.monotonic()
+            else:
+                while all(w.busy for w in self._workers):
+                    self._cond.wait()
+                worker = next(w for w in self._workers if not w.busy)
+            worker.busy = True
+            return worker
+
+    def _release(self, worker: PythonWorker, failed: bool) -> None:
+        with self._cond:
+            if failed:
+                worker.kill()
+                if worker in self._workers:
+                    index = self._workers.index(worker)
+                    self._workers[index] = PythonWorker(self._context)
+                    now = time.monotonic()
+                    self._lost = {
+                        name: lost
+                        for name, lost in self._lost.items()
+                        if now - lost <= self.session_ttl
+                    }
+                    self._lost.update(dict.fromkeys(worker.sessions, now))
+            worker.busy = False
+            self._cond.notify_all()
+
+    def _was_lost(self, session: str | None) -> bool:
+        with self._cond:
+            return self._lost.pop(session, None) is not None
+
+    def _drops(self, worker: PythonWorker, keep: str | None) -> list[str]:
+        """Collect the sessions to free on ``worker``: deleted or idle too long."""
+        now = time.monotonic()
+        with self._cond:
+            names = [
+                name
+                for name, used in worker.sessions.items()
+                if name != keep and now - used > self.session_ttl
+            ]
+            for name in names:
+                del worker.sessions[name]
+            names.extend(worker.dropped)
+            worker.dropped.clear()
+        return names
+
+    def run(self, code: str, data: Any, session: str | None = None) -> Any:
+        worker = self._acquire(session)
+        request = {
+            "code": code,
+            "data": data,
+            "session": session,
+            "drop": self._drops(worker, session),
+        }
+        failed = False
+        try:
+            status, value = worker.call(request, self.timeout)
+        except TimeoutError:
+            failed = True
+            raise HTTPException(
+                status_code=504,
+                detail=f"Code did not finish within {self.timeout:g} s; its worker was restarted",
+            )
+        except (EOFError, OSError):
+            failed = True
+            raise HTTPException(
+                status_code=500,
+                detail=f"Python worker died (exit code {worker.process.exitcode}); "
+                "it was restarted and its sessions were lost",
+            )
+        finally:
+            self._release(worker, failed)
+        lost = session is not None and self._was_lost(session)
+        if status == "error":
+            if lost:
+                raise HTTPException(
+                    status_code=410,
+                    detail=f"Session {session!r} was lost when its worker was "
+                    f"restarted; send its data again ({value})",
+                )
+            raise HTTPException(status_code=400, detail=value)
+        return value
+
+    def drop_session(self, session: str) -> bool:
+        with self._cond:
+            lost = self._lost.pop(session, None) is not None
+            worker = next((w for w in self._workers if session in w.sessions), None)
+            if worker is None:
+                return lost
+            del worker.sessions[session]
+            # the namespace is released with the worker's next call
+            worker.dropped.append(session)
+        return True
+
+    def close(self) -> None:
+        with self._cond:
+            for worker in self._workers:
+                worker.kill()
+
+
+@_lazy
+def get_python_pool() -> PythonWorkerPool:
+    return PythonWorkerPool(PYTHON_WORKERS, PYTHON_TIMEOUT, PYTHON_SESSION_TTL)
+
+
+@app.post("/python")
+def run_python(req: CodeRequest) -> Any:
+    """Execute arbitrary Python code with optional data in a worker process.
+
+    With a ``session`` name variables (including ``data``) persist between
+    calls, so ``data`` can be omitted once it has been sent.
+    """
+    result = get_python_pool().run(req.code, req.data, req.session)
+    if isinstance(result, np.ndarray):
+        return result
     try:
         from fastapi.encoders import jsonable_encoder
 
@@ -950,6 +4325,420 @@ def run_python(req: CodeRequest) -> Any:
         raise HTTPException(status_code=400, detail=f"Unable to serialize result: {exc}")
 
 
+@app.delete("/python/sessions/{session}")
+def drop_python_session(session: str) -> dict:
+    """Forget a named ``/python`` session and its variables."""
+    if not get_python_pool().drop_session(session):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"status": "deleted"}
+
+
+class FlowRequest(BaseModel):
+    """LiteGraph flow to run on the server.
+
+    ``outputs`` lists the ids of the nodes whose results should be returned;
+    by default every backend node whose results are not consumed by another
+    backend node is returned. Flows submitted with the same ``session`` reuse
+    the outputs of nodes whose properties and inputs did not change.
+    """
+
+    flow: dict
+    outputs: List[int] | None = None
+    session: str | None = None
+
+
+def _flow_matrix(value: Any) -> np.ndarray:
+    """Coerce a node input into a 2D float matrix like ``ApiNode`` does."""
+    pd = _pandas()
+
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        value = pd.DataFrame(value)
+    if isinstance(value, pd.DataFrame):
+        return value.select_dtypes("number").fillna(0).to_numpy(dtype=float)
+    try:
+        data = np.asarray(value, dtype=float)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return data.reshape(-1, 1) if data.ndim == 1 else data
+
+
+def _flow_params(props: dict) -> dict:
+    """Node properties as endpoint params, with integral floats as ``int``.
+
+    Slider values are stored as floats; ApiNode rounds step-1 sliders before
+    posting, and estimators reject ``5.0`` for integer params.
+    """
+    return {
+        k: int(v) if isinstance(v, float) and v.is_integer() else v
+        for k, v in props.items()
+    }
+
+
+def _flow_api_node(endpoint: Callable[[Matrix], Any], outputs: tuple[str, ...] = ()):
+    """Adapt a matrix endpoint to the flow node calling convention."""
+
+    def run(props: dict, inputs: list) -> list:
+        dataset = inputs[1] if len(inputs) > 1 else None
+        if dataset is not None:
+            matrix = Matrix(dataset=dataset, params=_flow_params(props), cache=True)
+        elif inputs[0] is None:
+            return [None] * max(len(outputs), 1)
+        else:
+            matrix = Matrix.model_construct(
+                data=_flow_matrix(inputs[0]), params=_flow_params(props), cache=True
+            )
+        result = endpoint(matrix)
+        if outputs:
+            return [result[name] for name in outputs]
+        return [result]
+
+    return run
+
+
+def _flow_titanic(props: dict, inputs: list) -> list:
+    columns = _split_param([props["columns"]] if props.get("columns") else None)
+    table = query_table(
+        get_dataset_table(), columns=columns, limit=int(props.get("limit", 5))
+    )
+    return [table.to_pandas()]
+
+
+def _flow_select(props: dict, inputs: list) -> list:
+    pd = _pandas()
+
+    data = inputs[0]
+    if data is None:
+        return [None, None]
+    frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    field = props.get("field")
+    fields = [f for f in props.get("fields") or [] if f in frame.columns]
+    values = frame[field].to_numpy() if field in frame.columns else None
+    return [values, frame[fields] if fields else None]
+
+
+def _flow_bias_report(props: dict, inputs: list) -> list:
+    if inputs[0] is None:
+        return [None]
+    try:
+        values = np.asarray(inputs[0], dtype=float).flatten()
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return [compute_bias_report(values)]
+
+
+def _flow_describe(props: dict, inputs: list) -> list:
+    if inputs[0] is None:
+        return [None]
+    return [describe_table(TableData(data=_flow_records(inputs[0])))]
+
+
+def _flow_imshow(props: dict, inputs: list) -> list:
+    if inputs[0] is None:
+        return [None]
+
+    def limit(value: Any) -> float | None:
+        return None if value in (None, "", "auto") else float(value)
+
+    return [
+        render_imshow(
+            inputs[0],
+            props.get("cmap", "viridis"),
+            props.get("interpolation", "nearest"),
+            limit(props.get("vmin")),
+            limit(props.get("vmax")),
+        )
+    ]
+
+
+def _flow_python(props: dict, inputs: list) -> list:
+    data = _flow_records(inputs[0] if inputs else None)
+    if isinstance(data, np.ndarray):
+        # memoized upstream outputs are read-only (and stay so when pickled);
+        # give the snippet its own copy
+        data = data.copy()
+    return [get_python_pool().run(props.get("code", ""), data)]
+
+
+FLOW_NODE_TYPES: dict[str, Callable[[dict, list], list]] = {
+    "data/titanic": _flow_titanic,
+    "data/describe": _flow_describe,
+    "transform/select": _flow_select,
+    "analysis/bias_report": _flow_bias_report,
+    "util/python": _flow_python,
+    "viz/imshow": _flow_imshow,
+    "ml/tsne": _flow_api_node(tsne),
+    "ml/umap": _flow_api_node(umap),
+    "ml/dbscan": _flow_api_node(dbscan),
+    "ml/spectral": _flow_api_node(spectral),
+    "ml/kmeans": _flow_api_node(kmeans, ("labels", "centers")),
+    "ml/gmm": _flow_api_node(gmm, ("labels", "means")),
+    "ml/pca": _flow_api_node(pca),
+    "ml/isolation_forest": _flow_api_node(isolation_forest),
+    "ml/lof": _flow_api_node(local_outlier_factor),
+    "ml/hyperdr": _flow_api_node(hyperdr),
+}
+
+
+def _flow_records(frame: Any) -> Any:
+    pd = _pandas()
+
+    if isinstance(frame, pd.DataFrame):
+        return frame.replace({np.nan: None}).to_dict(orient="records")
+    return frame
+
+
+def _flow_jsonable(value: Any) -> Any:
+    """Serialize a node output for the response."""
+    pd = _pandas()
+
+    if isinstance(value, pd.DataFrame):
+        return _flow_records(value)
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == "f" and np.isnan(value).any():
+            return np.where(np.isnan(value), None, value).tolist()
+        return value.tolist()
+    if isinstance(value, dict):
+        return {k: _flow_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_flow_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _flow_links(flow: dict) -> list[tuple[int, int, int, int]]:
+    """Return ``(origin_id, origin_slot, target_id, target_slot)`` tuples.
+
+    LiteGraph serializes links as arrays; objects with named keys are
+    accepted as well.
+    """
+    links = []
+    for link in flow.get("links") or []:
+        if isinstance(link, dict):
+            links.append(
+                (
+                    link["origin_id"],
+                    link["origin_slot"],
+                    link["target_id"],
+                    link["target_slot"],
+                )
+            )
+        else:
+            links.append((link[1], link[2], link[3], link[4]))
+    return links
+
+
+def flow_execution_plan(
+    flow: dict, outputs: List[int] | None = None
+) -> tuple[list[dict], list[tuple[int, int, int, int]], list[int]]:
+    """Topologically order the nodes needed to produce ``outputs``.
+
+    Returns the ordered nodes, the flow links and the ids of the sink nodes
+    whose results are reported.
+    """
+    nodes = {node["id"]: node for node in flow.get("nodes") or []}
+    links = [link for link in _flow_links(flow) if link[0] in nodes and link[2] in nodes]
+    backend = {nid for nid, node in nodes.items() if node.get("type") in FLOW_NODE_TYPES}
+
+    if outputs is None:
+        feeds_backend = {src for src, _, dst, _ in links if dst in backend}
+        outputs = sorted(backend - feeds_backend)
+    missing = [nid for nid in outputs if nid not in nodes]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Unknown output nodes: {missing}")
+
+    upstream: dict[int, set[int]] = {nid: set() for nid in nodes}
+    for src, _, dst, _ in links:
+        upstream[dst].add(src)
+    needed: set[int] = set()
+    stack = list(outputs)
+    while stack:
+        nid = stack.pop()
+        if nid not in needed:
+            needed.add(nid)
+            stack.extend(upstream[nid])
+
+    unsupported = sorted({nodes[nid].get("type") for nid in needed if nid not in backend})
+    if unsupported:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Node types cannot run on the server: {unsupported}",
+        )
+
+    # Kahn's algorithm over the needed sub-graph
+    indegree = {nid: len(upstream[nid] & needed) for nid in needed}
+    ready = sorted(nid for nid, deg in indegree.items() if deg == 0)
+    order: list[dict] = []
+    while ready:
+        nid = ready.pop(0)
+        order.append(nodes[nid])
+        for src, _, dst, _ in links:
+            if src == nid and dst in needed:
+                indegree[dst] -= 1
+                if indegree[dst] == 0:
+                    ready.append(dst)
+    if len(order) != len(needed):
+        raise HTTPException(status_code=400, detail="Flow contains a cycle")
+    return order, links, list(outputs)
+
+
+def flow_value_digest(value: Any) -> str:
+    """Content hash of a node output used to detect unchanged inputs."""
+    pd = _pandas()
+
+    h = hashlib.sha256()
+    if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+        h.update(f"{value.dtype}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value))
+    elif isinstance(value, pd.DataFrame):
+        h.update(json.dumps(list(map(str, value.columns))).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy())
+    else:
+        h.update(json.dumps(_flow_jsonable(value), sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def _flow_node_key(node: dict, input_digests: list[str | None]) -> str:
+    h = hashlib.sha256()
+    h.update(
+        json.dumps(
+            [node.get("type"), node.get("properties") or {}, input_digests],
+            sort_keys=True,
+            default=str,
+        ).encode()
+    )
+    return h.hexdigest()
+
+
+class FlowSessionStore:
+    """Per-session memo of the last outputs computed for every flow node.
+
+    Each node entry holds the key it was computed under (node type,
+    properties and digests of its inputs), its outputs and their digests.
+    The least recently used sessions are dropped beyond ``max_sessions`` and
+    sessions idle for longer than ``ttl`` seconds expire.
+    """
+
+    def __init__(self, max_sessions: int, ttl: float):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session: str) -> dict[int, tuple[str, list, list[str]]]:
+        """Return the (mutable) node memo for ``session``, creating it if needed."""
+        now = time.time()
+        with self._lock:
+            for sid in [
+                sid for sid, (seen, _) in self._sessions.items() if now - seen > self.ttl
+            ]:
+                del self._sessions[sid]
+            _, memo = self._sessions.pop(session, (now, {}))
+            self._sessions[session] = (now, memo)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return memo
+
+    def drop(self, session: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session, None) is not None
+
+
+FLOW_SESSIONS = FlowSessionStore(
+    int(os.environ.get("FLOW_SESSION_LIMIT", 64)),
+    float(os.environ.get("FLOW_SESSION_TTL", 3600)),
+)
+
+
+def execute_flow(
+    flow: dict, outputs: List[int] | None = None, session: str | None = None
+) -> tuple[dict[int, list], list[int], list[int]]:
+    """Run a LiteGraph flow in-process and return the sink node outputs.
+
+    Intermediate values are passed between nodes as numpy arrays and
+    DataFrames without being serialized. With a ``session`` only nodes whose
+    properties or input contents changed since the previous run are
+    recomputed. Returns the sink outputs and the ids of the recomputed and
+    reused nodes.
+    """
+    order, links, sinks = flow_execution_plan(flow, outputs)
+    memo = FLOW_SESSIONS.get(session) if session else None
+    results: dict[int, list] = {}
+    digests: dict[int, list[str]] = {}
+    recomputed: list[int] = []
+    cached: list[int] = []
+    for node in order:
+        nid = node["id"]
+        inputs: list[Any] = [None] * len(node.get("inputs") or [])
+        input_digests: list[str | None] = [None] * len(inputs)
+        for src, src_slot, dst, dst_slot in links:
+            if dst == nid and src in results:
+                while len(inputs) <= dst_slot:
+                    inputs.append(None)
+                    input_digests.append(None)
+                produced = results[src]
+                if src_slot < len(produced):
+                    inputs[dst_slot] = produced[src_slot]
+                    if memo is not None:
+                        input_digests[dst_slot] = digests[src][src_slot]
+        if memo is not None:
+            key = _flow_node_key(node, input_digests)
+            entry = memo.get(nid)
+            if entry is not None and entry[0] == key:
+                results[nid], digests[nid] = entry[1], entry[2]
+                cached.append(nid)
+                continue
+        run = FLOW_NODE_TYPES[node["type"]]
+        try:
+            results[nid] = run(node.get("properties") or {}, inputs)
+        except HTTPException as exc:
+            raise HTTPException(
+                status_code=exc.status_code,
+                detail=f"Node {nid} ({node['type']}): {exc.detail}",
+            )
+        except Exception as exc:
+            raise HTTPException(
+                status_code=400, detail=f"Node {nid} ({node['type']}): {exc}"
+            )
+        recomputed.append(nid)
+        if memo is not None:
+            _freeze_arrays(results[nid])
+            digests[nid] = [flow_value_digest(v) for v in results[nid]]
+            memo[nid] = (key, results[nid], digests[nid])
+    return {nid: results[nid] for nid in sinks}, recomputed, cached
+
+
+@app.post("/flows/execute")
+def flows_execute(req: FlowRequest) -> dict:
+    """Execute a LiteGraph flow on the server in a single request."""
+    nodes = {node["id"]: node for node in req.flow.get("nodes") or []}
+    outputs, recomputed, cached = execute_flow(req.flow, req.outputs, req.session)
+    response: dict[str, Any] = {}
+    for nid, values in outputs.items():
+        names = [
+            slot.get("name") or str(i)
+            for i, slot in enumerate(nodes[nid].get("outputs") or [])
+        ]
+        names += [str(i) for i in range(len(names), len(values))]
+        response[str(nid)] = {
+            name: _flow_jsonable(value) for name, value in zip(names, values)
+        }
+    return {
+        "outputs": response,
+        "session": req.session,
+        "recomputed": recomputed,
+        "cached": cached,
+    }
+
+
+@app.delete("/flows/sessions/{session}")
+def flows_drop_session(session: str) -> dict:
+    """Forget the memoized node outputs of a flow session."""
+    if not FLOW_SESSIONS.drop(session):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"status": "ok"}
+
+
 def lch_to_lab(l: float, c: float, h: float) -> tuple[float, float, float]:
     hr = math.radians(h)
     return l, math.cos(hr) * c, math.sin(hr) * c
@@ -1001,58 +4790,435 @@ def suggest_palette(params: PaletteParams) -> list[str]:
     return colors
 
 
-@app.post("/copilot")
-def copilot_endpoint(req: CopilotRequest) -> dict:
-    """Forward question and context to the GigaChat API."""
+COPILOT_MAX_CONTEXT_BYTES = int(
+    os.environ.get("COPILOT_MAX_CONTEXT_BYTES", 128 * 1024)
+)
+COPILOT_IMAGE_MAX_PX = int(os.environ.get("COPILOT_IMAGE_MAX_PX", 256))
+COPILOT_LOG_CHARS = int(os.environ.get("COPILOT_LOG_CHARS", 2000))
+COPILOT_CONVERSATION_LIMIT = int(os.environ.get("COPILOT_CONVERSATION_LIMIT", 256))
+COPILOT_CONVERSATION_TTL = float(os.environ.get("COPILOT_CONVERSATION_TTL", 3600))
+# downsampled node images by digest of the original data URL
+COPILOT_IMAGES = ResultCache(
+    int(os.environ.get("COPILOT_IMAGE_CACHE_BYTES", 32 * 1024 * 1024))
+)
+
+
+def truncate_for_log(text: str, limit: int = COPILOT_LOG_CHARS) -> str:
+    """Cut ``text`` to ``limit`` characters, noting how much was left out."""
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+@functools.lru_cache(maxsize=64)
+def copilot_prefix(
+    system_prompt: str | None, mode: str, node_descriptions: tuple[str, ...]
+) -> tuple[tuple[dict, ...], str]:
+    """Return the static leading messages of a copilot request and their digest.
+
+    The system prompt, node descriptions and (in generate mode) the example
+    flows are the same on every turn, so they are serialized once and always
+    sent first, in the same order, which lets the API reuse its cached prefix.
+    """
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    static: dict[str, Any] = {}
+    if node_descriptions:
+        static["node_descriptions"] = list(node_descriptions)
+    if mode == "generate":
+        static["examples"] = GENERATION_EXAMPLES
+    if static:
+        messages.append({"role": "user", "content": json.dumps(static)})
+    digest = hashlib.sha256(json.dumps(messages).encode()).hexdigest()[:32]
+    return tuple(messages), digest
+
+
+def _downsample_image(url: str) -> str:
+    header, _, encoded = url.partition(",")
+    if not header.startswith("data:image/") or ";base64" not in header:
+        return url
+    try:
+        from PIL import Image
+    except ImportError:  # pragma: no cover - Pillow missing
+        return url
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(encoded)))
+        if max(image.size) <= COPILOT_IMAGE_MAX_PX:
+            return url
+        image.thumbnail((COPILOT_IMAGE_MAX_PX, COPILOT_IMAGE_MAX_PX))
+        buf = io.BytesIO()
+        image.save(buf, format="PNG", optimize=True)
+    except Exception:  # not a decodable image; pass it on unchanged
+        return url
+    small = "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode()
+    return small if len(small) < len(url) else url
+
+
+def compact_image(url: str) -> tuple[str, str]:
+    """Return a digest of a node image and the image downsampled for the prompt."""
+    digest = hashlib.sha256(url.encode()).hexdigest()[:16]
+    small = COPILOT_IMAGES.get(digest)
+    if small is None:
+        small = _downsample_image(url)
+        COPILOT_IMAGES.put(digest, small, len(small))
+    return digest, small
+
+
+def _clip(value: Any, chars: int = 200, items: int = 20) -> Any:
+    if isinstance(value, str) and len(value) > chars:
+        return f"{value[:chars]}... ({len(value)} chars)"
+    if isinstance(value, list):
+        clipped = [_clip(v, chars, items) for v in value[:items]]
+        if len(value) > items:
+            clipped.append(f"... ({len(value)} items)")
+        return clipped
+    if isinstance(value, dict):
+        return {k: _clip(v, chars, items) for k, v in value.items()}
+    return value
+
+
+def compact_flow(flow: Any) -> dict | None:
+    """Reduce a LiteGraph flow to node ids, types, properties and links.
+
+    Layout and UI state are dropped and long property values clipped.
+    Returns ``None`` for flows that are not shaped like LiteGraph's.
+    """
+    if not isinstance(flow, dict) or not isinstance(flow.get("nodes"), list):
+        return None
+    if not all(isinstance(node, dict) for node in flow["nodes"]):
+        raise HTTPException(status_code=400, detail="flow.nodes must contain objects")
+    nodes = []
+    for node in flow["nodes"]:
+        entry = {"id": node.get("id"), "type": node.get("type")}
+        if node.get("title"):
+            entry["title"] = node["title"]
+        if node.get("properties"):
+            entry["properties"] = _clip(node["properties"])
+        nodes.append(entry)
+    links = []
+    for link in flow.get("links") or []:
+        if isinstance(link, dict):
+            keys = ("origin_id", "origin_slot", "target_id", "target_slot")
+            links.append([link.get(k) for k in keys])
+        elif isinstance(link, list) and len(link) >= 5:
+            links.append(link[1:5])
+    return {"nodes": nodes, "links": links}
+
+
+def diff_flow(before: dict, after: dict) -> dict:
+    """Describe how compacted flow ``after`` differs from ``before``."""
+    old = {n["id"]: n for n in before["nodes"]}
+    new = {n["id"]: n for n in after["nodes"]}
+
+    def same_node(node_id: Any) -> bool:
+        return old[node_id].get("type") == new[node_id].get("type")
+
+    diff: dict[str, Any] = {
+        "added_nodes": [n for i, n in new.items() if i not in old or not same_node(i)],
+        "removed_nodes": [i for i in old if i not in new or not same_node(i)],
+        "changed_nodes": [
+            n for i, n in new.items() if i in old and same_node(i) and old[i] != n
+        ],
+    }
+    old_links = {tuple(link) for link in before["links"]}
+    new_links = {tuple(link) for link in after["links"]}
+    diff["added_links"] = [list(link) for link in new_links - old_links]
+    diff["removed_links"] = [list(link) for link in old_links - new_links]
+    return {k: v for k, v in diff.items() if v}
+
+
+class CopilotConversation:
+    """What earlier turns of a conversation already sent to the model."""
+
+    def __init__(self) -> None:
+        # each turn: question, context and answer messages
+        self.turns: list[list[dict]] = []
+        self.flow: Any = None
+        self.images: set[str] = set()
+
+
+class ConversationStore:
+    """Copilot conversations kept in memory, LRU-bounded with an idle TTL."""
+
+    def __init__(self, max_conversations: int, ttl: float):
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self._conversations: OrderedDict[str, tuple[float, CopilotConversation]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str) -> CopilotConversation:
+        now = time.time()
+        with self._lock:
+            for cid in [
+                cid
+                for cid, (seen, _) in self._conversations.items()
+                if now - seen > self.ttl
+            ]:
+                del self._conversations[cid]
+            entry = self._conversations.pop(conversation_id, None)
+            conversation = entry[1] if entry is not None else CopilotConversation()
+            self._conversations[conversation_id] = (now, conversation)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        return conversation
+
+
+COPILOT_CONVERSATIONS = ConversationStore(
+    COPILOT_CONVERSATION_LIMIT, COPILOT_CONVERSATION_TTL
+)
+
+
+def _context_bytes(messages: list[dict]) -> int:
+    return sum(len(m["content"].encode()) for m in messages)
+
+
+def build_copilot_context(req: CopilotRequest) -> dict:
+    """Assemble the messages of a copilot turn within the byte budget.
+
+    Within a ``conversation`` earlier turns are replayed, so in Q&A mode only
+    the changes to the flow since the previous turn are sent, and images the
+    model has already seen are referenced by digest. Images are deduplicated
+    and downsampled. When the messages exceed ``COPILOT_MAX_CONTEXT_BYTES``
+    the earlier turns are dropped (the flow and images are then sent in full
+    again), then image data, then node properties; a context that still does
+    not fit is rejected with 413.
+    """
+    system_prompt = req.system_prompt or DEFAULT_COPILOT_PROMPTS.get(req.mode)
+    prefix, prefix_id = copilot_prefix(
+        system_prompt, req.mode, tuple(req.node_descriptions or ())
+    )
+    # conversations and GigaChat's prompt cache are scoped to the credentials
+    credentials = _gigachat_credentials(req.client_id, req.client_secret)
+    scope = hashlib.sha256(json.dumps(credentials).encode()).hexdigest()[:16]
+    conversation = (
+        COPILOT_CONVERSATIONS.get(f"{scope}:{req.conversation}")
+        if req.conversation
+        else None
+    )
+    turns = list(conversation.turns) if conversation else []
+    compact = compact_flow(req.flow) if req.flow is not None else None
+    # modify mode answers with a complete flow, so it needs the full one
+    flow = compact if compact is not None and req.mode == "qna" else req.flow
+    images: dict[str, str] = {}
+    for url in req.images or ():
+        digest, small = compact_image(url)
+        images.setdefault(digest, small)
+    omitted: set[str] = set()
+
+    def turn_context() -> dict:
+        context: dict[str, Any] = {"mode": req.mode}
+        if flow is not None:
+            # only flows that both came out of compact_flow can be diffed
+            if (
+                turns
+                and req.mode == "qna"
+                and compact is not None
+                and conversation.flow is not None
+            ):
+                context["flow_changes"] = diff_flow(conversation.flow, flow) or "none"
+            else:
+                context["flow"] = flow
+        if images:
+            context["images"] = [
+                {"id": digest, "seen": True}
+                if turns and digest in conversation.images
+                else {"id": digest, "omitted": True}
+                if digest in omitted
+                else {"id": digest, "data": data}
+                for digest, data in images.items()
+            ]
+        return context
+
+    def assemble() -> list[dict]:
+        question = {"role": "user", "content": req.question}
+        context = {"role": "user", "content": json.dumps(turn_context())}
+        return [*prefix, *(m for turn in turns for m in turn), question, context]
+
+    messages = assemble()
+    while _context_bytes(messages) > COPILOT_MAX_CONTEXT_BYTES and turns:
+        # without the full history the flow and images are sent again
+        turns = []
+        messages = assemble()
+    for digest in sorted(images, key=lambda d: -len(images[d])):
+        if _context_bytes(messages) <= COPILOT_MAX_CONTEXT_BYTES:
+            break
+        omitted.add(digest)
+        messages = assemble()
+    if (
+        _context_bytes(messages) > COPILOT_MAX_CONTEXT_BYTES
+        and req.mode == "qna"
+        and compact is not None
+    ):
+        # keep only the structure of the flow
+        nodes = [
+            {k: v for k, v in node.items() if k != "properties"}
+            for node in flow["nodes"]
+        ]
+        flow = {**flow, "nodes": nodes}
+        messages = assemble()
+    if _context_bytes(messages) > COPILOT_MAX_CONTEXT_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail="Copilot context exceeds COPILOT_MAX_CONTEXT_BYTES "
+            f"({COPILOT_MAX_CONTEXT_BYTES}) even without history and images",
+        )
+    session = f"{scope}:{req.conversation or prefix_id}"
+    return {
+        "messages": messages,
+        "session_id": hashlib.sha256(session.encode()).hexdigest()[:32],
+        "conversation": conversation,
+        "turns": turns,
+        # what later Q&A turns diff against: always a compacted flow
+        "flow": None if compact is None else flow if req.mode == "qna" else compact,
+        "replaces_flow": req.flow is not None,
+        "images": set(images) - omitted,
+    }
+
+
+def record_copilot_turn(context: dict, answer: str) -> None:
+    """Remember a finished turn in its conversation, if there is one."""
+    conversation = context["conversation"]
+    if conversation is None:
+        return
+    question, turn_context = context["messages"][-2:]
+    conversation.turns = [
+        *context["turns"],
+        [question, turn_context, {"role": "assistant", "content": answer}],
+    ]
+    if context["replaces_flow"]:
+        conversation.flow = context["flow"]
+    if not context["turns"]:
+        conversation.images = set()
+    conversation.images |= context["images"]
+
+
+def log_copilot_payload(payload: dict) -> None:
+    text = json.dumps(payload, ensure_ascii=False)
+    logger.info(
+        "LLM request (%d bytes, %d messages): %s",
+        len(text.encode()),
+        len(payload["messages"]),
+        truncate_for_log(text),
+    )
+
+
+async def gigachat_completion(
+    req: CopilotRequest, payload: dict, session_id: str, stream: bool = False
+) -> Any:
+    """Send a chat completion request and return the (unread if streaming) response.
+
+    ``session_id`` is sent as ``X-Session-ID`` so that requests sharing a
+    prompt prefix can reuse GigaChat's cached context. A cached token
+    rejected with 401 is dropped and the request retried once with a fresh one.
+    """
     url = os.environ.get(
         "GIGACHAT_API_URL",
         "https://gigachat.devices.sberbank.ru/api/v1/chat/completions",
     )
-    token = getAccessToken(req.client_id, req.client_secret)
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "X-Request-ID": str(uuid.uuid4()),
-        "X-Session-ID": str(uuid.uuid4()),
-    }
-    if req.client_id:
-        headers["X-Client-ID"] = req.client_id
-    messages: list[dict[str, str]] = []
-    system_prompt = req.system_prompt or DEFAULT_COPILOT_PROMPTS.get(req.mode)
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-    messages.append({"role": "user", "content": req.question})
-    context: dict[str, Any] = {"mode": req.mode}
-    if req.flow is not None:
-        context["flow"] = req.flow
-    if req.images:
-        context["images"] = req.images
-    if req.node_descriptions:
-        context["node_descriptions"] = req.node_descriptions
-    if req.mode == "generate":
-        context["examples"] = GENERATION_EXAMPLES
-    messages.append({"role": "user", "content": json.dumps(context)})
+    key = _gigachat_credentials(req.client_id, req.client_secret)
+    client = gigachat_client()
+    for attempt in range(2):
+        token = await get_access_token(req.client_id, req.client_secret)
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream" if stream else "application/json",
+            "X-Request-ID": str(uuid.uuid4()),
+            "X-Session-ID": session_id,
+        }
+        if req.client_id:
+            headers["X-Client-ID"] = req.client_id
+        request = client.build_request("POST", url, headers=headers, json=payload)
+        response = await client.send(request, stream=stream)
+        if response.status_code != 401 or attempt:
+            return response
+        await response.aclose()
+        GIGACHAT_TOKENS.invalidate(key)
+
+
+@app.post("/copilot")
+async def copilot_endpoint(req: CopilotRequest) -> dict:
+    """Forward question and context to the GigaChat API."""
+    context = build_copilot_context(req)
+    payload = {"model": req.model, "messages": context["messages"]}
+    log_copilot_payload(payload)
     try:
-        payload = {"model": req.model, "messages": messages}
-        logger.info("LLM request: %s", json.dumps(payload, ensure_ascii=False))
-        response = requests.post(
-            url,
-            headers=headers,
-            json=payload,
-            timeout=60,
-            verify=False,
-        )
+        response = await gigachat_completion(req, payload, context["session_id"])
         response.raise_for_status()
         data = response.json()
-        answer = (
-            data.get("choices", [{}])[0]
-            .get("message", {})
-            .get("content", "")
-        )
-        return {"answer": answer, "raw": data}
+    except HTTPException:
+        raise
     except Exception as exc:  # pragma: no cover - network failure or API error
         raise HTTPException(status_code=500, detail=str(exc))
+    answer = (
+        data.get("choices", [{}])[0]
+        .get("message", {})
+        .get("content", "")
+    )
+    record_copilot_turn(context, answer)
+    return {"answer": answer, "raw": data}
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/copilot/stream")
+async def copilot_stream(req: CopilotRequest) -> StreamingResponse:
+    """Forward the answer as server-sent events while GigaChat generates it.
+
+    Every event carries ``{"delta": text}``; a final ``done`` event carries
+    the whole ``answer`` and an ``error`` event reports a failure mid-stream.
+    """
+    context = build_copilot_context(req)
+    payload = {"model": req.model, "messages": context["messages"], "stream": True}
+    log_copilot_payload(payload)
+    try:
+        response = await gigachat_completion(
+            req, payload, context["session_id"], stream=True
+        )
+    except HTTPException:
+        raise
+    except Exception as exc:  # pragma: no cover - network failure
+        raise HTTPException(status_code=500, detail=str(exc))
+    if response.is_error:
+        detail = (await response.aread()).decode(errors="replace")
+        await response.aclose()
+        raise HTTPException(
+            status_code=500, detail=f"GigaChat error {response.status_code}: {detail}"
+        )
+
+    async def events() -> Any:
+        parts: list[str] = []
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                delta = chunk.get("choices", [{}])[0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield _sse({"delta": delta})
+            answer = "".join(parts)
+            record_copilot_turn(context, answer)
+            yield _sse({"answer": answer}, "done")
+        except Exception as exc:
+            yield _sse({"detail": str(exc)}, "error")
+        finally:
+            await response.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/palette")
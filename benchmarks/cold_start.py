@@ -0,0 +1,67 @@
+"""Measure backend cold start in fresh interpreter processes.
+
+Each run imports ``backend.server`` in a new Python process and reports the
+import time, the time until ``/health`` answers and, when ``--ready`` is
+given, the time until ``/ready`` reports the warm state. Results are printed
+as JSON with the median of all runs.
+
+Usage::
+
+    python benchmarks/cold_start.py --runs 5
+"""
+
+from pathlib import Path
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import backend.server as server
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(server.app) as client:
+    client.get("/health").raise_for_status()
+    healthy = time.perf_counter()
+    ready = None
+    if {ready!r}:
+        while client.get("/ready").status_code != 200:
+            time.sleep(0.05)
+        ready = time.perf_counter() - start
+print(json.dumps({{
+    "import_s": imported - start,
+    "health_s": healthy - start,
+    "ready_s": ready,
+}}))
+"""
+
+
+def run(runs: int, ready: bool) -> dict:
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(ready=ready)],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    summary = {"runs": runs}
+    for key in ("import_s", "health_s", "ready_s"):
+        values = [s[key] for s in samples if s[key] is not None]
+        summary[key] = statistics.median(values) if values else None
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ready", action="store_true", help="also wait for /ready")
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs, args.ready), indent=2))
@@ -0,0 +1,436 @@
+"""Time backend endpoints on synthetic inputs of growing size.
+
+For every endpoint and every ``(n, d)`` of the grid a request is measured
+in the phases FastAPI goes through:
+
+* ``parse_s`` - ``json.loads`` of the request body and pydantic validation,
+* ``compute_s`` - the endpoint function called directly with the parsed model,
+* ``serialize_s`` - turning the result into a JSON response body,
+
+followed by one end-to-end ``TestClient`` request (``total_s``). Peak
+Python/numpy allocations of a parse + compute + serialize run are measured
+separately with ``tracemalloc``. Phase times are the median of
+``--repeat`` runs, with the backend caches cleared before each one; an
+untimed warm-up run per endpoint keeps lazy imports and JIT compilation
+out of the numbers.
+
+Postgres and GigaChat are replaced by in-process stand-ins, so no external
+services are needed. Results are printed (or written with ``--output``) as
+JSON for comparing runs across commits.
+
+Usage::
+
+    python benchmarks/endpoints.py --n 100 1000 10000 --d 2 16 --output bench.json
+    python benchmarks/endpoints.py --endpoints pca kmeans --repeat 5
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, NamedTuple
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import httpx
+import numpy as np
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("GIGACHAT_CLIENT_ID", "benchmark")
+os.environ.setdefault("GIGACHAT_CLIENT_SECRET", "benchmark")
+
+from backend import server  # noqa: E402
+
+
+class FakeCursor:
+    """Cursor returning synthetic feedback rows for any query."""
+
+    def __init__(self, rows: int):
+        self.rows = rows
+        self.itersize = 1000
+        self.params: dict = {}
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+    def execute(self, query: str, params: Any = None) -> None:
+        self.params = params if isinstance(params, dict) else {}
+
+    def _row(self, i: int) -> tuple[int, dict]:
+        return i, {"message": f"feedback {i}", "likes": i % 7, "dislikes": i % 3}
+
+    def fetchall(self) -> list[tuple[int, dict]]:
+        return list(self)
+
+    def fetchone(self) -> tuple[int, dict]:
+        return self._row(1)
+
+    def __iter__(self):
+        limit = self.params.get("limit") or self.rows
+        return (self._row(i) for i in range(1, min(limit, self.rows) + 1))
+
+
+class FakePool:
+    """Stand-in for ``ConnectionPool`` that never touches a database."""
+
+    def __init__(self, rows: int):
+        self.rows = rows
+
+    @contextmanager
+    def connection(self):
+        yield SimpleNamespace(cursor=lambda name=None: FakeCursor(self.rows))
+
+
+def fake_gigachat(request: httpx.Request) -> httpx.Response:
+    """Answer GigaChat OAuth and chat calls without leaving the process."""
+    if "oauth" in str(request.url):
+        return httpx.Response(200, json={"access_token": "benchmark"})
+    answer = f"{len(request.content)} bytes of context"
+    return httpx.Response(200, json={"choices": [{"message": {"content": answer}}]})
+
+
+def install_stand_ins(feedback_rows: int) -> None:
+    pool = FakePool(feedback_rows)
+    server.get_db_pool = lambda: pool
+    transport = httpx.MockTransport(fake_gigachat)
+    server.gigachat_client = lambda: httpx.AsyncClient(transport=transport)
+
+
+def reset_caches() -> None:
+    """Empty every result/graph/tile cache so each run starts cold."""
+    for value in vars(server).values():
+        if isinstance(value, server.ResultCache):
+            value.clear()
+
+
+def rips_epsilon(n: int, d: int) -> float:
+    """Radius giving about five neighbours per point in the unit cube."""
+    ball = math.pi ** (d / 2) / math.gamma(d / 2 + 1)
+    return (5.0 / (n * ball)) ** (1.0 / d)
+
+
+def _matrix(params: dict | None = None) -> Callable:
+    def payload(n: int, d: int, rng: np.random.Generator) -> dict:
+        return {"data": rng.random((n, d)).tolist(), "params": dict(params or {}), "cache": False}
+
+    return payload
+
+
+def _series(n: int, d: int, rng: np.random.Generator) -> dict:
+    return {"data": rng.normal(size=n).tolist()}
+
+
+def _explain(n: int, d: int, rng: np.random.Generator) -> dict:
+    return {"data": rng.random((n, len(server.FEATURES))).tolist()}
+
+
+def _rips(n: int, d: int, rng: np.random.Generator) -> dict:
+    return {
+        "data": rng.random((n, d)).tolist(),
+        "params": {"epsilon": rips_epsilon(n, d)},
+        "cache": False,
+    }
+
+
+def _table(n: int, d: int, rng: np.random.Generator) -> dict:
+    columns = [f"c{j}" for j in range(d)]
+    values = rng.random((n, d))
+    return {"data": [dict(zip(columns, row)) for row in values.tolist()]}
+
+
+def _python(n: int, d: int, rng: np.random.Generator) -> dict:
+    return {"code": "[sum(row) for row in data]", "data": rng.random((n, d)).tolist()}
+
+
+def _palette(n: int, d: int, rng: np.random.Generator) -> dict:
+    return {"n": min(n, 256)}
+
+
+def _copilot(n: int, d: int, rng: np.random.Generator) -> dict:
+    nodes = [
+        {"id": i, "type": "analysis/pca", "properties": {"n_components": 2}}
+        for i in range(min(n, 2000))
+    ]
+    return {"question": "What does this flow do?", "model": "GigaChat", "flow": {"nodes": nodes}}
+
+
+def _feedback_query(n: int, d: int, rng: np.random.Generator) -> dict:
+    return {"limit": n}
+
+
+class Case(NamedTuple):
+    method: str
+    path: str
+    payload: Callable[[int, int, np.random.Generator], Any]
+    model: type | None
+    call: Callable[[Any], Any]
+    max_n: int
+    uses_d: bool = True
+
+
+CASES: dict[str, Case] = {
+    "tsne": Case("POST", "/tsne", _matrix(), server.Matrix, server.tsne, 5_000),
+    "umap": Case("POST", "/umap", _matrix(), server.Matrix, server.umap, 20_000),
+    "pca": Case("POST", "/pca", _matrix(), server.Matrix, server.pca, 100_000),
+    "kmeans": Case(
+        "POST", "/kmeans", _matrix({"n_clusters": 8}), server.Matrix, server.kmeans, 100_000
+    ),
+    "gmm": Case(
+        "POST", "/gmm", _matrix({"n_components": 4}), server.Matrix, server.gmm, 100_000
+    ),
+    "dbscan": Case("POST", "/dbscan", _matrix(), server.Matrix, server.dbscan, 100_000),
+    "spectral": Case(
+        "POST", "/spectral", _matrix({"n_clusters": 4}), server.Matrix, server.spectral, 2_000
+    ),
+    "lof": Case(
+        "POST", "/lof", _matrix(), server.Matrix, server.local_outlier_factor, 100_000
+    ),
+    "isolation_forest": Case(
+        "POST", "/isolation_forest", _matrix(), server.Matrix, server.isolation_forest, 100_000
+    ),
+    "hyperdr": Case("POST", "/hyperdr", _matrix(), server.Matrix, server.hyperdr, 10_000),
+    "persistence": Case(
+        "POST", "/persistence", _matrix(), server.Matrix, server.persistence_diagram, 1_000
+    ),
+    "vietoris_rips": Case(
+        "POST", "/vietoris_rips", _rips, server.Matrix, server.vietoris_rips, 100_000
+    ),
+    "imshow": Case(
+        "POST",
+        "/imshow",
+        _matrix(),
+        server.ImshowRequest,
+        lambda req: server.imshow(req, None),
+        100_000,
+    ),
+    "explain": Case(
+        "POST", "/explain", _explain, server.ExplainRequest, server.explain, 10_000, False
+    ),
+    "describe": Case(
+        "POST", "/describe", _table, server.TableData, server.describe_table, 100_000
+    ),
+    "confidence": Case(
+        "POST", "/confidence", _series, server.Series, server.confidence_interval, 100_000, False
+    ),
+    "bias-report": Case(
+        "POST", "/bias-report", _series, server.TableData, server.bias_report, 100_000, False
+    ),
+    "python": Case(
+        "POST", "/python", _python, server.CodeRequest, server.run_python, 100_000
+    ),
+    "palette": Case(
+        "POST", "/palette", _palette, server.PaletteParams, server.palette_endpoint, 100_000, False
+    ),
+    "copilot": Case(
+        "POST",
+        "/copilot",
+        _copilot,
+        server.CopilotRequest,
+        lambda req: asyncio.run(server.copilot_endpoint(req)),
+        100_000,
+        False,
+    ),
+    "feedback": Case(
+        "GET",
+        "/feedback",
+        _feedback_query,
+        None,
+        lambda q: server.get_feedback(
+            Response(), None, q["limit"], None, None, False, None
+        ),
+        100_000,
+        False,
+    ),
+}
+
+
+def serialize(result: Any) -> bytes:
+    """Render a result the way the array-aware routes do."""
+    result = server._encode_result(result)
+    if isinstance(result, Response):
+        return result.body
+    return JSONResponse(result).body
+
+
+def run_phases(case: Case, body: bytes | None, query: dict | None) -> tuple[list[float], int]:
+    """Parse, compute and serialize once; return phase times and response size."""
+    start = time.perf_counter()
+    if case.model is not None:
+        parsed = case.model.model_validate(json.loads(body))
+    else:
+        parsed = query
+    parsed_at = time.perf_counter()
+    result = case.call(parsed)
+    computed_at = time.perf_counter()
+    payload = serialize(result)
+    done = time.perf_counter()
+    return [parsed_at - start, computed_at - parsed_at, done - computed_at], len(payload)
+
+
+def measure(
+    case: Case,
+    client: TestClient,
+    n: int,
+    d: int,
+    repeat: int,
+    memory: bool,
+    warm_up: bool = False,
+) -> dict:
+    rng = np.random.default_rng(0)
+    payload = case.payload(n, d, rng)
+    if case.method == "POST":
+        body, query = json.dumps(payload).encode(), None
+    else:
+        body, query = None, payload
+    phases = []
+    if warm_up:
+        reset_caches()
+        run_phases(case, body, query)
+    for _ in range(repeat):
+        reset_caches()
+        times, response_bytes = run_phases(case, body, query)
+        phases.append(times)
+    parse_s, compute_s, serialize_s = (statistics.median(p) for p in zip(*phases))
+
+    peak_bytes = None
+    if memory:
+        reset_caches()
+        tracemalloc.start()
+        try:
+            run_phases(case, body, query)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    reset_caches()
+    start = time.perf_counter()
+    if case.method == "POST":
+        response = client.post(
+            case.path, content=body, headers={"Content-Type": "application/json"}
+        )
+    else:
+        response = client.get(case.path, params=query)
+    total_s = time.perf_counter() - start
+    return {
+        "endpoint": case.path,
+        "n": n,
+        "d": d if case.uses_d else None,
+        "status": response.status_code,
+        "request_bytes": len(body) if body is not None else 0,
+        "response_bytes": response_bytes,
+        "parse_s": parse_s,
+        "compute_s": compute_s,
+        "serialize_s": serialize_s,
+        "total_s": total_s,
+        "peak_bytes": peak_bytes,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def run(
+    endpoints: list[str],
+    ns: list[int],
+    ds: list[int],
+    repeat: int,
+    memory: bool,
+    max_seconds: float,
+    ignore_limits: bool,
+) -> dict:
+    logging.disable(logging.INFO)
+    install_stand_ins(max(ns))
+    client = TestClient(server.app)
+    results = []
+    for name in endpoints:
+        case = CASES[name]
+        for d in ds if case.uses_d else ds[:1]:
+            for i, n in enumerate(sorted(ns)):
+                if n > case.max_n and not ignore_limits:
+                    break
+                try:
+                    result = measure(case, client, n, d, repeat, memory, warm_up=i == 0)
+                except Exception as exc:  # keep going; record the failure
+                    results.append(
+                        {"endpoint": case.path, "n": n, "d": d, "error": repr(exc)}
+                    )
+                    break
+                results.append(result)
+                print(
+                    f"{case.path} n={n} d={d}: {result['compute_s']:.4f}s compute",
+                    file=sys.stderr,
+                )
+                if result["compute_s"] > max_seconds:
+                    break
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(CASES), default=sorted(CASES))
+    parser.add_argument("--n", nargs="+", type=int, default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument("--d", nargs="+", type=int, default=[2, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=60.0,
+        help="skip larger n for an endpoint once its compute time exceeds this",
+    )
+    parser.add_argument(
+        "--ignore-limits",
+        action="store_true",
+        help="also run sizes above each endpoint's default maximum n",
+    )
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc runs")
+    parser.add_argument("--output", type=Path, help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    report = run(
+        args.endpoints,
+        args.n,
+        args.d,
+        args.repeat,
+        not args.no_memory,
+        args.max_seconds,
+        args.ignore_limits,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    else:
+        print(text)
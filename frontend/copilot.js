@@ -6,6 +6,9 @@ document.addEventListener('DOMContentLoaded', () => {
   const qna = document.getElementById('copilot-qna');
   const output = document.getElementById('copilot-output');
   const modeSelect = document.getElementById('copilot-mode');
+  // Q&A turns of this page share a conversation, so follow-up questions only
+  // send what changed in the flow since the previous one
+  const conversation = crypto.randomUUID();
 
   hideBtn.addEventListener('click', () => {
     copilot.style.display = 'none';
@@ -39,6 +42,10 @@ document.addEventListener('DOMContentLoaded', () => {
     }
     if (mode === 'qna') {
       payload.images = collectNodeImages();
+      payload.conversation = conversation;
+      // answers are shown while they are generated
+      streamAnswer(payload, output).then(() => (qna.value = ''));
+      return;
     }
     fetch('http://localhost:8000/copilot', {
       method: 'POST',
@@ -76,6 +83,46 @@ document.addEventListener('DOMContentLoaded', () => {
   });
 });
 
+// Append the answer to `output` as /copilot/stream delivers it (server-sent events).
+async function streamAnswer(payload, output) {
+  const pre = document.createElement('pre');
+  output.appendChild(pre);
+  try {
+    const res = await fetch('http://localhost:8000/copilot/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(payload)
+    });
+    if (!res.ok) {
+      pre.textContent = JSON.stringify(await res.json(), null, 2);
+      return;
+    }
+    const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const block of events) {
+        let event = 'message';
+        let data = '';
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) continue;
+        const msg = JSON.parse(data);
+        if (event === 'message') pre.textContent += msg.delta;
+        else if (event === 'error') pre.textContent += '\nError: ' + msg.detail;
+      }
+    }
+  } catch (err) {
+    pre.textContent += '\nError: ' + err.message;
+  }
+}
+
 function collectNodeImages() {
   const images = [];
   if (window.graph && graph._nodes) {
@@ -6,9 +6,11 @@ function widgetAreaHeight(node) {
 function TitanicNode() {
   this.addOutput('data', 'array');
   this.addProperty('limit', 5);
+  this.addProperty('columns', '');
   this.color = '#222';
   this.bgcolor = '#444';
   this.addWidget('slider', 'limit', this.properties.limit, v => (this.properties.limit = v), { min: 1, max: 50, step: 1, precision: 0 });
+  this.addWidget('text', 'columns', this.properties.columns, v => (this.properties.columns = v));
 }
 TitanicNode.title = 'Titanic Sample';
 TitanicNode.icon = '🚢';
@@ -17,7 +19,9 @@ TitanicNode.prototype.onExecute = async function() {
   this._pending = true;
   try {
     const limit = Math.round(this.properties.limit);
-    const res = await fetch(`http://localhost:8000/passengers?limit=${limit}`);
+    const params = new URLSearchParams({ limit });
+    if (this.properties.columns) params.set('columns', this.properties.columns);
+    const res = await fetch(`http://localhost:8000/passengers?${params}`);
     const data = await res.json();
     this.setOutputData(0, data);
   } catch (err) {
@@ -30,6 +34,7 @@ registerNode('data/titanic', TitanicNode);
 
 function CsvNode() {
   this.addOutput('data', 'array');
+  this.addOutput('dataset', 'string');
   this.addProperty('url', '');
   this.addProperty('separator', ',');
   this.addProperty('header', true);
@@ -89,11 +94,28 @@ CsvNode.prototype.loadFromFile = function() {
       this._data = this.parse(txt);
       this.setOutputData(0, this._data);
     });
+    this.upload(file);
   });
   input.click();
 };
+CsvNode.prototype.upload = async function(file) {
+  // store the file server-side once so analytics nodes can reference it by id
+  try {
+    const res = await fetch('http://localhost:8000/datasets', {
+      method: 'POST',
+      headers: { 'Content-Type': 'text/csv' },
+      body: file,
+    });
+    if (!res.ok) throw new Error(await res.text());
+    this._dataset = (await res.json()).dataset;
+    this.setOutputData(1, this._dataset);
+  } catch (err) {
+    console.error(err);
+  }
+};
 CsvNode.prototype.onExecute = function() {
   if (this._data) this.setOutputData(0, this._data);
+  if (this._dataset) this.setOutputData(1, this._dataset);
 };
 registerNode('data/csv', CsvNode);
 
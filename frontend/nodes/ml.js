@@ -9,7 +9,11 @@ async function fetchExplanation(model, data) {
 
 function ApiNode(endpoint, title, params, outputs) {
   this.endpoint = endpoint;
+  // extra query string, e.g. 'float32=true' to receive shorter floats
+  this.query = '';
   this.addInput('data', 'array');
+  // id of a dataset uploaded by the CSV node; sent instead of the rows
+  this.addInput('dataset', 'string');
   this.outputs = [];
   const outs = outputs && outputs.length ? outputs : ['result'];
   outs.forEach(name => this.addOutput(name, 'array'));
@@ -52,7 +56,8 @@ function ApiNode(endpoint, title, params, outputs) {
 }
 ApiNode.prototype.onExecute = async function() {
   let data = this.getInputData(0);
-  if (!data || this._pending) return;
+  const dataset = this.getInputData(1);
+  if ((!data && !dataset) || this._pending) return;
   // ensure 2D array
   if (Array.isArray(data) && data.length) {
     if (typeof data[0] === 'number') {
@@ -67,7 +72,7 @@ ApiNode.prototype.onExecute = async function() {
       data = data.map(o => keys.map(k => (typeof o[k] === 'number' ? o[k] : 0)));
     }
   }
-  const payload = { data };
+  const payload = dataset ? { dataset } : { data };
   if (this.properties && Object.keys(this.properties).length) {
     payload.params = {};
     for (const k in this.properties) {
@@ -85,7 +90,8 @@ ApiNode.prototype.onExecute = async function() {
   }
   this._pending = true;
   try {
-    const res = await fetch(`http://localhost:8000/${this.endpoint}`, {
+    const query = this.query ? `?${this.query}` : '';
+    const res = await fetch(`http://localhost:8000/${this.endpoint}${query}`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(payload),
@@ -105,6 +111,8 @@ ApiNode.prototype.onExecute = async function() {
 
 function TsneNode() {
   ApiNode.call(this, 'tsne', 't-SNE', { perplexity: { value: 30, min: 5, max: 50 } });
+  // embedding coordinates only feed plots; float32 precision is plenty
+  this.query = 'float32=true';
 }
 TsneNode.title = 't-SNE';
 TsneNode.icon = '🌀';
@@ -144,6 +152,7 @@ function UmapNode() {
       ],
     },
   });
+  this.query = 'float32=true';
 }
 UmapNode.title = 'UMAP';
 UmapNode.icon = '🌐';
@@ -234,6 +243,7 @@ function HyperdrNode() {
     latent_dim: { value: 2, min: 1, max: 10, step: 1 },
     grid_size: { value: 10, min: 2, max: 50, step: 1 },
   });
+  this.query = 'float32=true';
 }
 HyperdrNode.title = 'HyperDR';
 HyperdrNode.icon = '✨';
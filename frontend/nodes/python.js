@@ -6,6 +6,12 @@ function PythonNode() {
   this.color = '#222';
   this.bgcolor = '#444';
   this.addWidget('text', 'code', this.properties.code, v => (this.properties.code = v), { multiline: true });
+  // optional server-side session: variables and `data` persist between runs
+  this.addProperty('session', '');
+  this.addWidget('text', 'session', this.properties.session, v => {
+    this.properties.session = v;
+    this._sentData = undefined;
+  });
 }
 PythonNode.title = 'Python';
 PythonNode.icon = '🐍';
@@ -14,14 +20,20 @@ PythonNode.prototype.onExecute = async function() {
   if (this._pending) return;
   this._pending = true;
   try {
+    const session = this.properties.session || undefined;
+    const payload = { code: this.properties.code, session };
+    // within a session the server keeps `data`; only resend it when it changed
+    if (!session || data !== this._sentData) payload.data = data;
     const res = await fetch('http://localhost:8000/python', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ code: this.properties.code, data }),
+      body: JSON.stringify(payload),
     });
+    this._sentData = res.ok && session ? data : undefined;
     const out = await res.json();
     this.setOutputData(0, out);
   } catch (err) {
+    this._sentData = undefined;
     console.error(err);
   } finally {
     this._pending = false;
@@ -0,0 +1,224 @@
+"""Copilot endpoints against a local mock of the GigaChat OAuth and chat APIs."""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import server
+
+OAUTH_URL = "https://gigachat.test/api/v2/oauth"
+CHAT_URL = "https://gigachat.test/api/v1/chat/completions"
+
+
+class MockGigaChat:
+    """Answers OAuth and chat completion calls like GigaChat does."""
+
+    def __init__(self, lifetime: float = 1800):
+        self.lifetime = lifetime
+        self.oauth_calls = 0
+        self.chat_calls: list[httpx.Request] = []
+        self.reject = 0
+        self.stream_chunks = ["Hello", " from", " GigaChat"]
+        self.stream_tail = "data: [DONE]\n\n"
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if str(request.url) == OAUTH_URL:
+            assert request.headers["authorization"].startswith("Basic ")
+            self.oauth_calls += 1
+            # concurrent token requests overlap while this one is in flight
+            await asyncio.sleep(0.05)
+            return httpx.Response(
+                200,
+                json={
+                    "access_token": f"token-{self.oauth_calls}",
+                    "expires_at": int((time.time() + self.lifetime) * 1000),
+                },
+            )
+        assert str(request.url) == CHAT_URL
+        self.chat_calls.append(request)
+        if self.reject:
+            self.reject -= 1
+            return httpx.Response(401, json={"message": "Token has expired"})
+        body = json.loads(request.content)
+        if body.get("stream"):
+            events = "".join(
+                "data: "
+                + json.dumps({"choices": [{"delta": {"content": chunk}}]})
+                + "\n\n"
+                for chunk in self.stream_chunks
+            )
+            return httpx.Response(
+                200,
+                content=events + self.stream_tail,
+                headers={"Content-Type": "text/event-stream"},
+            )
+        answer = "".join(self.stream_chunks)
+        return httpx.Response(200, json={"choices": [{"message": {"content": answer}}]})
+
+
+@pytest.fixture
+def gigachat(monkeypatch):
+    mock = MockGigaChat()
+    transport = httpx.MockTransport(mock)
+    monkeypatch.setenv("GIGACHAT_OAUTH_URL", OAUTH_URL)
+    monkeypatch.setenv("GIGACHAT_API_URL", CHAT_URL)
+    monkeypatch.setenv("GIGACHAT_CLIENT_ID", "client")
+    monkeypatch.setenv("GIGACHAT_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(
+        server, "gigachat_client", lambda: httpx.AsyncClient(transport=transport)
+    )
+    monkeypatch.setattr(
+        server, "GIGACHAT_TOKENS", server.TokenCache(server.GIGACHAT_TOKEN_MARGIN)
+    )
+    return mock
+
+
+def sse_events(text: str) -> list[tuple[str | None, dict]]:
+    events = []
+    for block in text.strip().split("\n\n"):
+        event = None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+
+def test_concurrent_misses_fetch_one_token(gigachat):
+    async def fetch_many() -> list[str]:
+        return await asyncio.gather(*(server.get_access_token() for _ in range(8)))
+
+    tokens = asyncio.run(fetch_many())
+    assert tokens == ["token-1"] * 8
+    assert gigachat.oauth_calls == 1
+
+
+def test_expires_at_is_read_as_milliseconds(gigachat):
+    key = server._gigachat_credentials(None, None)
+    before = time.time()
+    token, expires_at = asyncio.run(server._fetch_access_token(*key))
+    assert token == "token-1"
+    assert before + 1790 < expires_at < time.time() + 1810
+
+
+def test_token_is_reused_until_close_to_expiry(gigachat):
+    async def fetch_twice() -> tuple[str, str]:
+        return await server.get_access_token(), await server.get_access_token()
+
+    assert asyncio.run(fetch_twice()) == ("token-1", "token-1")
+    assert gigachat.oauth_calls == 1
+
+    # a token expiring within GIGACHAT_TOKEN_MARGIN is refreshed every time
+    gigachat.lifetime = server.GIGACHAT_TOKEN_MARGIN / 2
+    server.GIGACHAT_TOKENS.invalidate(server._gigachat_credentials(None, None))
+    assert asyncio.run(fetch_twice()) == ("token-2", "token-3")
+
+
+def test_rejected_token_is_invalidated_and_retried(gigachat):
+    client = TestClient(server.app)
+    body = {"question": "What does this flow do?", "model": "GigaChat"}
+    assert client.post("/copilot", json=body).status_code == 200
+
+    gigachat.reject = 1
+    response = client.post("/copilot", json=body)
+    assert response.status_code == 200
+    assert response.json()["answer"] == "Hello from GigaChat"
+    assert gigachat.oauth_calls == 2
+    auth = [r.headers["authorization"] for r in gigachat.chat_calls]
+    assert auth == ["Bearer token-1", "Bearer token-1", "Bearer token-2"]
+
+
+def test_repeated_401_is_reported(gigachat):
+    gigachat.reject = 2
+    client = TestClient(server.app)
+    response = client.post("/copilot", json={"question": "q", "model": "GigaChat"})
+    assert response.status_code == 500
+    assert len(gigachat.chat_calls) == 2
+
+
+def test_stream_sends_deltas_then_done(gigachat):
+    client = TestClient(server.app)
+    response = client.post(
+        "/copilot/stream", json={"question": "q", "model": "GigaChat"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.endswith("\n\n")
+    assert sse_events(response.text) == [
+        (None, {"delta": "Hello"}),
+        (None, {"delta": " from"}),
+        (None, {"delta": " GigaChat"}),
+        ("done", {"answer": "Hello from GigaChat"}),
+    ]
+    assert json.loads(gigachat.chat_calls[0].content)["stream"] is True
+
+
+def test_stream_reports_errors_mid_stream(gigachat):
+    gigachat.stream_tail = "data: {not json\n\n"
+    client = TestClient(server.app)
+    response = client.post(
+        "/copilot/stream", json={"question": "q", "model": "GigaChat"}
+    )
+    events = sse_events(response.text)
+    assert [event for event, _ in events] == [None, None, None, "error"]
+    assert "detail" in events[-1][1]
+
+
+def test_stream_upstream_error_fails_before_streaming(gigachat):
+    gigachat.reject = 2
+    client = TestClient(server.app)
+    response = client.post(
+        "/copilot/stream", json={"question": "q", "model": "GigaChat"}
+    )
+    assert response.status_code == 500
+    assert "401" in response.json()["detail"]
+
+
+def last_context(gigachat) -> dict:
+    messages = json.loads(gigachat.chat_calls[-1].content)["messages"]
+    return json.loads(messages[-1]["content"])
+
+
+def test_follow_up_sends_flow_changes(gigachat):
+    client = TestClient(server.app)
+    flow = {
+        "nodes": [{"id": 1, "type": "a", "pos": [0, 0]}, {"id": 2, "type": "b"}],
+        "links": [[1, 1, 0, 2, 0, "array"]],
+    }
+    body = {"question": "q", "model": "GigaChat", "conversation": "flows"}
+    # the modify turn sees the full flow, the Q&A turn diffs against it
+    client.post("/copilot", json={**body, "flow": flow, "mode": "modify"})
+    client.post("/copilot", json={**body, "flow": flow})
+    assert last_context(gigachat)["flow_changes"] == "none"
+
+    flow["nodes"].append({"id": 3, "type": "c"})
+    client.post("/copilot", json={**body, "flow": flow})
+    assert last_context(gigachat)["flow_changes"] == {
+        "added_nodes": [{"id": 3, "type": "c"}]
+    }
+
+
+def test_unknown_flow_shapes_are_sent_in_full(gigachat):
+    client = TestClient(server.app)
+    body = {"question": "q", "model": "GigaChat", "conversation": "odd"}
+    body["flow"] = {"a": 1}
+    for _ in range(2):
+        assert client.post("/copilot", json=body).status_code == 200
+        assert last_context(gigachat)["flow"] == {"a": 1}
+    body["flow"] = {"nodes": [1, 2]}
+    assert client.post("/copilot", json=body).status_code == 400
+
+
+def test_session_id_depends_on_credentials(gigachat):
+    client = TestClient(server.app)
+    body = {"question": "q", "model": "GigaChat"}
+    client.post("/copilot", json=body)
+    client.post("/copilot", json=body)
+    client.post("/copilot", json={**body, "client_id": "x", "client_secret": "y"})
+    sessions = [r.headers["x-session-id"] for r in gigachat.chat_calls]
+    assert sessions[0] == sessions[1] != sessions[2]